@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ==========================================
+# ADMISSION CONTROL
+# ==========================================
+# When the proctor starts the exam every waiting session flips to RUNNING at
+# once and pays for its first full render (Scenario 1 videos included) in the
+# same second. Sessions entering RUNNING first ask for a slot here:
+#   - at most ADMISSION_MAX_STARTING sessions may be doing their first
+#     RUNNING render at the same time (a slot is returned when that render
+#     finishes, or after ADMISSION_LEASE_SECONDS if the browser went away);
+#   - optionally at most ADMISSION_MAX_RUNNING sessions are in the exam at all
+#     (0 = no cap); a student leaves at FINISH or after ADMISSION_IDLE_SECONDS
+#     without a timer tick.
+# Everyone else waits in a FIFO queue on a page that renders one line and
+# polls request(); a queued student who stops polling for
+# ADMISSION_QUEUE_SECONDS (closed tab) loses their place. Limits
+# are per process: with serve.py each worker admits its own share of the room.
+# While in WAIT, students prefetch the first videos at a time spread over
+# PREFETCH_SPREAD_SECONDS (see prefetch_due), not all at the start signal.
+
+ADMISSION_MAX_STARTING = int(os.getenv("ADMISSION_MAX_STARTING", "25"))
+ADMISSION_MAX_RUNNING = int(os.getenv("ADMISSION_MAX_RUNNING", "0"))
+ADMISSION_LEASE_SECONDS = float(os.getenv("ADMISSION_LEASE_SECONDS", "15"))
+ADMISSION_IDLE_SECONDS = float(os.getenv("ADMISSION_IDLE_SECONDS", "60"))
+ADMISSION_QUEUE_SECONDS = float(os.getenv("ADMISSION_QUEUE_SECONDS", "10"))
+PREFETCH_SPREAD_SECONDS = float(os.getenv("PREFETCH_SPREAD_SECONDS", "60"))
+
+_queue = OrderedDict()  # name -> last poll, in arrival order
+_starting = {}          # name -> lease expiry of a first-render slot
+_running = {}           # name -> last timer tick
+_lock = threading.Lock()
+_stats = {'admitted': 0, 'expired': 0, 'abandoned': 0}
+
+
+def _expire(now):
+    for name, seen in list(_queue.items()):
+        if now - seen > ADMISSION_QUEUE_SECONDS:
+            del _queue[name]
+            _stats['abandoned'] += 1
+    for name, expiry in list(_starting.items()):
+        if expiry < now:
+            del _starting[name]
+            _stats['expired'] += 1
+    for name, seen in list(_running.items()):
+        if now - seen > ADMISSION_IDLE_SECONDS:
+            del _running[name]
+
+
+def _free_slots():
+    free = ADMISSION_MAX_STARTING - len(_starting) if ADMISSION_MAX_STARTING > 0 else len(_queue)
+    if ADMISSION_MAX_RUNNING > 0:
+        free = min(free, ADMISSION_MAX_RUNNING - len(_running) - len(_starting))
+    return max(0, free)
+
+
+def request(name, now=None):
+    """Ask to enter RUNNING: 0 if admitted, else the student's place in the queue."""
+    now = now or time.time()
+    with _lock:
+        if name in _starting or name in _running:
+            return 0
+        _expire(now)
+        _queue[name] = now  # keeps its place; only the poll time changes
+        place = list(_queue).index(name) + 1
+        if place <= _free_slots():
+            del _queue[name]
+            _starting[name] = now + ADMISSION_LEASE_SECONDS
+            _stats['admitted'] += 1
+            return 0
+        return place - _free_slots()
+
+
+def started(name, now=None):
+    """The first RUNNING render is done: give the start slot back."""
+    now = now or time.time()
+    with _lock:
+        _starting.pop(name, None)
+        _running[name] = now
+
+
+def touch(name, now=None):
+    if name not in _starting:
+        _running[name] = now or time.time()
+
+
+def leave(name):
+    with _lock:
+        _queue.pop(name, None)
+        _starting.pop(name, None)
+        _running.pop(name, None)
+
+
+def prefetch_due(name, entered, now=None):
+    """True once this student's staggered prefetch time (after `entered`) has come."""
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=4).digest()
+    offset = int.from_bytes(digest, 'big') / 2**32 * PREFETCH_SPREAD_SECONDS
+    return (now or time.time()) >= entered + offset
+
+
+def admission_stats():
+    with _lock:
+        return {'queued': len(_queue), 'starting': len(_starting), 'running': len(_running), **_stats}
+
+
+def reset():
+    with _lock:
+        _queue.clear()
+        _starting.clear()
+        _running.clear()
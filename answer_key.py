@@ -0,0 +1,177 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from scenarios import KEYED_FIELDS
+
+# ==========================================
+# ANSWER KEY ENGINE (deterministic scoring)
+# ==========================================
+# Short-answer and choice fields are scored locally for the whole cohort at
+# once. Each field maps canonical answers to the spellings we accept (English,
+# Thai, common synonyms). Unique answers are matched once and broadcast back to
+# every row, so the cost grows with the number of *distinct* answers, not
+# students. Only near-misses ('ambiguous') are sent on to the AI grader.
+
+FUZZY_MAX_RATIO = 0.2       # edit distance / length accepted as a typo
+AMBIGUOUS_MAX_RATIO = 0.45  # between the two thresholds: ask the AI grader
+
+# field -> {'kind': 'choice' | 'term', 'question': ..., 'accept': {canonical: [aliases]}}
+# The keys are written next to their questions in scenarios.py
+ANSWER_KEY = dict(KEYED_FIELDS)
+
+# Fields answering the same question in any order: a canonical answer only
+# scores once per student.
+ANSWER_GROUPS = [('s1_p1_chem1', 's1_p1_chem2'), ('s2_pair_0', 's2_pair_1', 's2_pair_2')]
+
+# Scenario 2 hormones are scored as (hormone, change) pairs built from two columns
+DERIVED_FIELDS = {f's2_pair_{i}': (f's2_hormone_{i}', f's2_change_{i}') for i in range(3)}
+_S2_PAIRS = {
+    'Insulin Decrease': ['Insulin Decrease'],
+    'Glucagon Increase': ['Glucagon Increase'],
+    'Cortisol Increase': ['Cortisol Increase'],
+    'Catecholamine Increase': ['Catecholamine Increase'],
+    'Growth hormone Increase': ['Growth hormone Increase'],
+}
+for _field in DERIVED_FIELDS:
+    ANSWER_KEY[_field] = {'kind': 'choice', 'accept': _S2_PAIRS}
+
+# keep letters, digits and the whole Thai block (Thai vowel/tone marks are not \w)
+_STRIP = re.compile(r"[^\w\u0E00-\u0E7F]+")
+
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFC', str(text or '')).casefold().replace('β', 'beta')
+    return _STRIP.sub('', text)
+
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _compile(spec):
+    # normalized alias -> canonical answer
+    aliases = {}
+    for canonical, spellings in spec['accept'].items():
+        for text in [canonical] + list(spellings):
+            aliases[normalize_text(text)] = canonical
+    return aliases
+
+
+_COMPILED = {}
+
+
+def compiled_aliases(field):
+    spec = ANSWER_KEY[field]
+    aliases = _COMPILED.get(id(spec))
+    if aliases is None:
+        aliases = _COMPILED[id(spec)] = _compile(spec)
+    return aliases
+
+
+def _match_unique(value, aliases, kind):
+    """(status, canonical) for one distinct normalized answer."""
+    if not value:
+        return 'blank', None
+    if value in aliases:
+        return 'exact', aliases[value]
+    if kind == 'choice':
+        return 'wrong', None
+    # "adrenal medulla gland" or "norepinephrine" contain a key term but may
+    # or may not be right: let the AI grader decide
+    for alias, canonical in aliases.items():
+        if len(alias) >= 4 and alias in value:
+            return 'ambiguous', canonical
+    best, best_ratio = None, 1.0
+    for alias, canonical in aliases.items():
+        ratio = edit_distance(value, alias) / max(len(alias), 1)
+        if ratio < best_ratio:
+            best, best_ratio = canonical, ratio
+    if best_ratio <= FUZZY_MAX_RATIO:
+        return 'fuzzy', best
+    if best_ratio <= AMBIGUOUS_MAX_RATIO:
+        return 'ambiguous', best
+    return 'wrong', None
+
+
+def answer_frame(rows):
+    """DataFrame of raw answers (one row per student) with derived columns added."""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    df = df.copy()
+    for field, (left, right) in DERIVED_FIELDS.items():
+        if left in df and right in df:
+            df[field] = df[left].fillna('').astype(str) + ' ' + df[right].fillna('').astype(str)
+    return df
+
+
+def score_cohort(rows, fields=None):
+    """Score every keyed field for every student in one pass.
+
+    Returns (scores, status, canonical): three DataFrames indexed like the
+    input, one column per field. A correct answer scores 1.0, anything else
+    0.0; rows whose status is 'ambiguous' should be sent to the AI grader.
+    """
+    df = answer_frame(rows)
+    fields = fields or list(ANSWER_KEY)
+    status = pd.DataFrame(index=df.index)
+    canonical = pd.DataFrame(index=df.index)
+    for field in fields:
+        spec = ANSWER_KEY[field]
+        col = df[field] if field in df else pd.Series('', index=df.index)
+        aliases = compiled_aliases(field)
+        codes, uniques = pd.factorize(col.fillna('').astype(str), sort=False)
+        matched = [_match_unique(normalize_text(u), aliases, spec['kind']) for u in uniques]
+        status[field] = np.array([m[0] for m in matched], dtype=object)[codes]
+        canonical[field] = np.array([m[1] for m in matched], dtype=object)[codes]
+
+    correct = status.isin(['exact', 'fuzzy'])
+    for group in ANSWER_GROUPS:
+        cols = [f for f in group if f in correct]
+        # Repeating the same canonical answer in a group only counts once
+        for j in range(1, len(cols)):
+            later = canonical[cols[j]]
+            dup = pd.Series(False, index=df.index)
+            for earlier in cols[:j]:
+                dup |= later.notna() & (later == canonical[earlier])
+            correct[cols[j]] &= ~dup
+            status[cols[j]] = status[cols[j]].mask(dup, 'duplicate')
+    return correct.astype(float), status, canonical
+
+
+def ambiguous_answers(rows, status):
+    """Long-form (row, field, answer) records for answers the AI grader should see."""
+    df = answer_frame(rows)
+    stacked = status.stack()
+    pending = stacked[stacked == 'ambiguous']
+    return [
+        {'row': row, 'field': field, 'answer': df.at[row, field]}
+        for row, field in pending.index
+    ]
+
+
+def route_ambiguous(records, submit):
+    """Send ambiguous answers to `submit(question, answer, rubric, tag)`.
+
+    Identical (field, normalized answer) pairs are submitted once; the
+    returned dict maps each record's (row, field) to its job id.
+    """
+    jobs = {}
+    seen = {}
+    for rec in records:
+        spec = ANSWER_KEY[rec['field']]
+        key = (rec['field'], normalize_text(rec['answer']))
+        if key not in seen:
+            rubric = "; ".join(spec['accept'])
+            seen[key] = submit(spec.get('question', rec['field']), rec['answer'], rubric, tag=rec['field'])
+        jobs[(rec['row'], rec['field'])] = seen[key]
+    return jobs
@@ -1,114 +1,64 @@
 import streamlit as st
-import time
+import functools
 import json
 import os
-import pandas as pd
-from streamlit_sortables import sort_items
-import google.generativeai as genai
-import requests
+import time
+from assets import get_asset, preload
+import pdf_pages
+import coordinator
+import cohort
+import admission
+import grading
+import grade_cache
+from flowchart import ANSWER_HEADER, OPTIONS_HEADER
+import scenarios
+from scenarios import FIELD_MAPPING, PDF_MAP, PHASES
+import journal
+import export
+import item_analysis
+import similarity
+import state_store
+import metrics
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "1234")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+WAIT_POLL_SECONDS = float(os.getenv("WAIT_POLL_SECONDS", "2"))
+TIMER_TICK_SECONDS = float(os.getenv("TIMER_TICK_SECONDS", "1"))
 
 st.set_page_config(page_title="PCM Biology Exam (Round 2)", layout="wide")
 
-# Initialize AI
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel('gemini-1.5-pro')
-else:
-    model = None
-
+# The Gemini client is configured and built once per process, on first use
+# (see grading.get_model); nothing AI-related is imported to render the exam.
 def get_ai_grade(question, student_ans, rubric):
-    if not GOOGLE_API_KEY or not model:
-        return "Error: No API Key (Mock Score: 0/10)"
+    model = grading.get_model(GOOGLE_API_KEY)
+    if not model:
+        return grading.NO_MODEL_RESULT
     try:
-        prompt = f"""
-Role: Biology Examiner.
-Task: Grade this student answer strictly based on keywords.
-Question: {question}
-Student Answer: {student_ans}
-Rubric Keywords: {rubric}
-Output format: Give ONLY the score (0-10) and a short 1-sentence feedback.
-Example: Score: 8/10. Correctly identified receptor but missed competitive inhibition.
-"""
-        response = model.generate_content(prompt)
-        return response.text
+        with metrics.timed('grade_seconds'):
+            return grade_cache.cached_grade(
+                grade_cache.get_cache(), model, question, student_ans, rubric,
+                lambda: grading.grade_answer(model, question, student_ans, rubric)
+            )
     except Exception as e:
         return f"AI Error: {e}"
 
-# FIELD_MAPPING จาก HTML จริงของคุณ
-FIELD_MAPPING = {
-    # Section 1: Student Info
-    'student_name': 'entry.1428432169',
-
-    # Scenario 1: Phase 1
-    's1_p1_vdo1': 'entry.1697216375',  # VDO 1 (Leg)
-    's1_p1_vdo2': 'entry.1874226739',  # VDO 2 (Eye)
-    's1_p1_system': 'entry.2095042542',  # ระบบประสาท
-    's1_p1_chem1': 'entry.696616887',   # กลุ่มสารเคมี 1
-    's1_p1_chem2': 'entry.698531293',   # กลุ่มสารเคมี 2
-
-    # Scenario 1: Phase 3 (Essays)
-    's1_essay1': 'entry.1913130773',  # Atropine mechanism
-    's1_essay2': 'entry.1292504947',  # Why not help muscle fasciculation
-
-    # Scenario 2: Phase 1 (Hormones)
-    's2_hormone_0': 'entry.1034834794',
-    's2_change_0': 'entry.1826209674',
-    's2_mech_0': 'entry.164598416',
-    's2_hormone_1': 'entry.1904032084',
-    's2_change_1': 'entry.1220042795',
-    's2_mech_1': 'entry.287683897',
-    's2_hormone_2': 'entry.1794613146',
-    's2_change_2': 'entry.1471211990',
-    's2_mech_2': 'entry.1516921212',
-
-    # Scenario 2: Phase 3 (Essays)
-    's2_essay1': 'entry.1177067011',  # Kussmaul breathing
-    's2_essay2': 'entry.1474268199',  # Hypokalemia after insulin
-
-    # Scenario 3: Phase 1
-    's3_diagnosis': 'entry.104900991',
-    's3_inheritance': 'entry.104900996',
-    's3_chance': 'entry.104907871',
-
-    # Scenario 3: Phase 3 (Essays)
-    's3_essay1': 'entry.104932597',  # Iron overload
-    's3_essay2': 'entry.104940377',  # CRISPR-Cas9
-
-    # Scenario 4: Phase 1
-    's4_q1_system': 'entry.104976657',  # ระบบประสาท
-    's4_q1_hormone': 'entry.104983229',  # ฮอร์โมน
-    's4_q1_source': 'entry.105054184',  # หลั่งจาก
-    's4_q2_hormone': 'entry.105072213',  # ฮอร์โมนไต
-    's4_q2_site': 'entry.105082017',    # ออกฤทธิ์ที่
-
-    # Scenario 4: Phase 3 (Essays)
-    's4_essay1': 'entry.105085109',  # Osmosis & seawater
-    's4_choice': 'entry.105110463',   # IV fluid choice
-    's4_reason': 'entry.105112557',   # Reason
-
-    # Scenario 5: Phase 1
-    's5_rv_type': 'entry.105114659',
-    's5_rv_role': 'entry.105140345',
-    's5_rig_type': 'entry.105143329',
-    's5_rig_role': 'entry.105180974',
-    's5_tt_type': 'entry.105255638',
-    's5_tt_role': 'entry.105276227',
-    's5_tat_type': 'entry.105283767',
-    's5_tat_role': 'entry.105292936',
-
-    # Scenario 5: Phase 3 (Essays)
-    's5_essay1': 'entry.105293666',  # RIG at wound site
-    's5_essay2': 'entry.105302093',  # No TAT if vaccinated before
-}
-
 # FORM_ID จากลิงก์ของคุณ
 FORM_ID = "1f0bQaARZzavstDVNpEIcGH78evPRNBaGNdbd55do3UU"
+# Point at a local stand-in (e.g. benchmarks/fake_form.py) for testing
+FORM_SUBMIT_URL = os.getenv("FORM_SUBMIT_URL")
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+PROCTOR_REFRESH_SECONDS = float(os.getenv("PROCTOR_REFRESH_SECONDS", "5"))
+
+def submit_to_google_form(data, form_id, field_mapping):
+    # Queue for the background sender and return at once (see outbox.py)
+    import outbox
+    with metrics.timed('submit_seconds'):
+        url = FORM_SUBMIT_URL or outbox.form_url(form_id)
+        payload = outbox.build_payload(data, field_mapping)
+        return outbox.get_outbox().enqueue(data.get('student_name', ''), url, payload)
 
 # Initialize session state
 if 'phase' not in st.session_state:
@@ -121,16 +71,347 @@ if 'current_phase' not in st.session_state:
     st.session_state.current_phase = 1
 if 'locked_phases' not in st.session_state:
     st.session_state.locked_phases = set()
+if 'journal_seen' not in st.session_state:
+    st.session_state.journal_seen = {}
+if 'flowchart_seeds' not in st.session_state:
+    st.session_state.flowchart_seeds = {}
 
 PHASE_TIMES = {1: 120, 2: 240, 3: 240}
 
-PDF_MAP = {
-    2: "Medical Fact Sheet_Scenario2.pdf",
-    3: "Medical Fact Sheet_Scenario3.pdf",
-    4: "Medical Fact Sheet_Scenario4.pdf",
-    5: "Medical Fact Sheet_Scenario5.pdf"
+# Read every exam file once per process; later reruns only stat() them
+preload(list(PDF_MAP.values()) + [m.path for m in scenarios.media()])
+
+# /metrics and /metrics.json for scraping, when METRICS_PORT is set
+metrics.start_exporter()
+
+def section(name):
+    # Time one part of the current phase (see metrics.py and ?view=proctor)
+    return metrics.timed('section_seconds', section=name,
+                         scenario=st.session_state.current_scenario, phase=st.session_state.current_phase)
+
+def prefetch_media(paths):
+    # Hidden preload-only players: the browser fetches each file under the same
+    # /media URL st.video uses later, so the first RUNNING render hits its cache
+    from streamlit import runtime
+    players = []
+    for i, path in enumerate(paths):
+        asset = get_asset(path)
+        if asset:
+            url = runtime.get_instance().media_file_mgr.add(asset.data, asset.mime, f"prefetch.{i}")
+            players.append(f'<video src="{url}" preload="auto" muted style="display:none"></video>')
+    if players:
+        st.html("".join(players))
+
+# ----------------------------------------------------
+# ANSWER JOURNAL
+# ----------------------------------------------------
+def journal_answers():
+    # Append only the fields that changed since the last journaled run
+    name = st.session_state.answers.get('student_name')
+    if not name:
+        return
+    changed = journal.diff_answers(st.session_state.answers, st.session_state.journal_seen)
+    if changed:
+        state_store.get_store().record(name, journal.ANSWERS, changed)
+        st.session_state.journal_seen.update(changed)
+
+def journal_state():
+    name = st.session_state.answers.get('student_name')
+    if not name:
+        return
+    state_store.get_store().record(name, journal.STATE, {
+        'phase': st.session_state.phase,
+        'current_scenario': st.session_state.current_scenario,
+        'current_phase': st.session_state.current_phase,
+        'locked_phases': sorted(st.session_state.locked_phases),
+        'timers': {k: v for k, v in st.session_state.items() if str(k).startswith('start_time_')},
+    })
+    report_position()
+
+def report_position():
+    # This session's own record in the proctor's cohort registry, O(1)
+    cohort.update(st.session_state.answers['student_name'], st.session_state.phase,
+                  st.session_state.current_scenario, st.session_state.current_phase,
+                  len(st.session_state.locked_phases))
+
+def restore_session(saved):
+    answers = saved['answers']
+    state = saved['state']
+    st.session_state.answers.update(answers)
+    st.session_state.journal_seen = dict(st.session_state.answers)
+    st.session_state.phase = state.get('phase', 'WAIT')
+    st.session_state.current_scenario = state.get('current_scenario', 1)
+    st.session_state.current_phase = state.get('current_phase', 1)
+    st.session_state.locked_phases = {tuple(k) for k in state.get('locked_phases', [])}
+    for key, anchor in state.get('timers', {}).items():
+        st.session_state[key] = anchor
+    # Put the saved values back into the widgets of the phase being resumed
+    for field, value in answers.items():
+        if field.endswith('_flowchart'):
+            st.session_state.flowchart_seeds[int(field[1])] = value
+        elif field in scenarios.FIELDS:
+            st.session_state[scenarios.FIELDS[field].widget_key] = value
+
+def phase_fragment(render):
+    # st.fragment that journals the answers its widgets just wrote
+    @st.fragment
+    @functools.wraps(render)
+    def run(*args):
+        with section('questions'):
+            render(*args)
+        journal_answers()
+    return run
+
+@st.fragment
+def fact_sheet(sc, pdf_file):
+    # Shown inline one page at a time: a page image is only sent when the
+    # student opens the sheet or turns to it, and paging reruns this fragment only
+    with section('pdf'):
+        pages = pdf_pages.page_count(pdf_file)
+        if not pages:
+            pdf = get_asset(pdf_file)
+            if pdf:
+                st.download_button(
+                    label="📄 เปิด Medical Fact Sheet",
+                    data=pdf.data,
+                    file_name=pdf_file,
+                    mime="application/pdf"
+                )
+            return
+        if not st.toggle("📄 Medical Fact Sheet", key=f"pdf_open_s{sc}"):
+            return
+        page_key = f"pdf_page_s{sc}"
+        index = min(st.session_state.get(page_key, 0), pages - 1)
+
+        def turn(step):
+            st.session_state[page_key] = min(max(index + step, 0), pages - 1)
+
+        prev_col, label_col, next_col = st.columns([1, 4, 1])
+        prev_col.button("◀️ ก่อนหน้า", key=f"pdf_prev_s{sc}", disabled=index == 0, on_click=turn, args=(-1,))
+        next_col.button("ถัดไป ▶️", key=f"pdf_next_s{sc}", disabled=index == pages - 1, on_click=turn, args=(1,))
+        label_col.caption(f"หน้า {index + 1} / {pages}")
+        page = pdf_pages.page(pdf_file, index)
+        st.image(page.data, width='stretch')
+
+def advance_phase(sc, ph, next_anchor):
+    # Lock (sc, ph) and move to the next phase, whose timer starts at next_anchor
+    st.session_state.locked_phases.add((sc, ph))
+    if ph == 3:
+        if sc == scenarios.LAST_SCENARIO:
+            st.session_state.phase = 'FINISH'
+            journal_state()
+            return
+        sc, ph = sc + 1, 1
+    else:
+        ph += 1
+    st.session_state.current_scenario = sc
+    st.session_state.current_phase = ph
+    st.session_state[f"start_time_s{sc}_p{ph}"] = next_anchor
+    journal_state()
+
+# ----------------------------------------------------
+# PHASE RENDERER
+# ----------------------------------------------------
+# Draws a compiled scenarios.Phase. The phase's questions render inside one
+# st.fragment, so typing or dragging only re-runs that block instead of the
+# whole script; media stays outside it, so only full-script runs re-emit it.
+WIDGETS = {
+    'text': lambda q, key: st.text_input(q.label, key=key),
+    'textarea': lambda q, key: st.text_area(q.label, height=q.height, key=key),
+    'radio': lambda q, key: st.radio(q.label, q.options, key=key),
+    'select': lambda q, key: st.selectbox(q.label, q.options, key=key),
 }
 
+def render_block(block):
+    if isinstance(block, scenarios.Question):
+        st.session_state.answers[block.field.name] = WIDGETS[block.widget](block, block.field.widget_key)
+    elif isinstance(block, scenarios.Text):
+        if block.style == 'divider':
+            st.divider()
+        else:
+            getattr(st, block.style)(block.body)
+    elif isinstance(block, scenarios.Columns):
+        for col, blocks in zip(st.columns(len(block.columns)), block.columns):
+            with col:
+                for inner in blocks:
+                    render_block(inner)
+    elif isinstance(block, scenarios.Media):
+        asset = get_asset(block.path)
+        if not asset:
+            st.warning(block.missing)
+        elif block.kind == 'video':
+            with section('video'):
+                st.video(asset.data, format=asset.mime, loop=True, autoplay=True, muted=True)
+        else:
+            with section('image'):
+                st.image(asset.data, caption=block.caption, width='stretch')
+    elif isinstance(block, scenarios.Flowchart):
+        # streamlit_sortables is only imported once someone reaches a Phase 2
+        from streamlit_sortables import sort_items
+        sc = block.scenario
+        original_items = st.session_state.flowchart_seeds.get(sc) or [
+            {'header': OPTIONS_HEADER, 'items': list(block.blocks)}, {'header': ANSWER_HEADER, 'items': []}]
+        with section('sort_items'):
+            st.session_state.answers[f's{sc}_flowchart'] = sort_items(original_items, multi_containers=True)
+
+@phase_fragment
+def phase_questions(sc, ph):
+    for block in PHASES[sc, ph].body:
+        render_block(block)
+
+def render_phase(sc, ph):
+    for block in PHASES[sc, ph].static:
+        render_block(block)
+    phase_questions(sc, ph)
+
+# ----------------------------------------------------
+# PROCTOR VIEW (?view=proctor)
+# ----------------------------------------------------
+def position_label(pos):
+    return f"S{pos[0]} P{pos[1]}" if isinstance(pos, tuple) else pos
+
+@st.fragment(run_every=PROCTOR_REFRESH_SECONDS)
+def live_cohort():
+    import outbox
+    # Copies of the registry and one outbox query; no other session is touched
+    records, seen, counts = cohort.snapshot()
+    delivery = outbox.get_outbox().latest_statuses()
+    now = coordinator.now()
+
+    exam = coordinator.snapshot()
+    cols = st.columns(4)
+    cols[0].metric("นักเรียนทั้งหมด", len(records))
+    cols[1].metric("รอสอบ (WAIT)", counts.get('WAIT', 0))
+    cols[2].metric("กำลังสอบ", sum(v for k, v in counts.items() if isinstance(k, tuple)))
+    cols[3].metric("ส่งคำตอบแล้ว", sum(1 for status in delivery.values() if status == outbox.DELIVERED))
+    gate = admission.admission_stats()
+    st.caption(f"สถานะการสอบ: {exam.status} · คิวเข้าห้องสอบ (worker นี้): {gate['queued']} รอ, "
+               f"{gate['starting']} กำลังโหลด")
+
+    order = ['WAIT'] + [(sc, ph) for sc in range(1, 6) for ph in range(1, 4)] + ['FINISH']
+    st.bar_chart({position_label(k): counts.get(k, 0) for k in order}, horizontal=True)
+
+    late = cohort.stragglers(records, seen, now)
+    st.markdown(f"**⚠️ ต้องติดตาม ({len(late)})**")
+    if late:
+        st.dataframe([
+            {'นักเรียน': rec.name, 'ตำแหน่ง': position_label(cohort.position(rec)), 'เหตุผล': reason}
+            for rec, reason in late
+        ], width='stretch')
+
+    st.markdown("**การส่งคำตอบ**")
+    box = outbox.get_outbox().counts()
+    st.caption(" · ".join(f"{k}: {v}" for k, v in box.items()))
+    st.dataframe(sorted((
+        {'นักเรียน': rec.name, 'ตำแหน่ง': position_label(cohort.position(rec)),
+         'ล็อกแล้ว': rec.locked, 'ส่ง': delivery.get(rec.name, '-'),
+         'ล่าสุด (วินาที)': round(now - seen.get(rec.name, rec.updated_at))}
+        for rec in records
+    ), key=lambda r: r['นักเรียน']), width='stretch')
+
+@st.fragment(run_every=PROCTOR_REFRESH_SECONDS)
+def live_metrics():
+    snap = metrics.snapshot()
+    cols = st.columns(4)
+    cols[0].metric("Sessions", snap['sessions']['count'])
+    cols[1].metric("Session state (รวม)", f"{snap['sessions']['bytes_total'] / 1024:.0f} KiB")
+    cols[2].metric("Exam files cached", f"{snap['assets']['bytes'] / 2**20:.1f} MiB")
+    media = snap['streamlit_memory_bytes']
+    cols[3].metric("Media files (Streamlit)",
+                   f"{media.get('st_memory_media_file_storage', 0) / 2**20:.1f} MiB",
+                   f"{media.get('media_files', 0)} files", delta_color="off")
+    st.dataframe([
+        {'metric': h['name'], **h['labels'], 'count': h['count'],
+         'mean ms': 1000 * h['sum'] / h['count'] if h['count'] else 0.0,
+         'p95 ms': 1000 * metrics.bucket_quantile(h['buckets'], 0.95)}
+        for h in snap['histograms'] if h['name'].endswith('_seconds')
+    ], width='stretch')
+    if snap['counters']:
+        st.dataframe([{'counter': c['name'], **c['labels'], 'value': c['value']} for c in snap['counters']])
+    st.download_button("📥 Prometheus", metrics.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+    st.download_button("📥 JSON", json.dumps(snap, ensure_ascii=False, indent=2),
+                       file_name="metrics.json", mime="application/json")
+
+@st.fragment(run_every=PROCTOR_REFRESH_SECONDS)
+def live_items():
+    from answer_key import ANSWER_KEY
+    # Running sums from the store: cost depends on the number of items, not students
+    stats = item_analysis.snapshot()
+    alpha = stats.alpha()
+    cols = st.columns(3)
+    cols[0].metric("ส่งคำตอบแล้ว (นับในสถิติ)", stats.n)
+    cols[1].metric("ความเชื่อมั่น (Cronbach's α)", "-" if alpha is None else f"{alpha:.2f}")
+    cols[2].metric("คะแนนเฉลี่ย", f"{stats.x / stats.n:.1f} / {len(stats.items)}" if stats.n else "-")
+    if not stats.n:
+        st.info("ยังไม่มีนักเรียนส่งคำตอบ")
+        return
+
+    def verdict(row):
+        if row['discrimination'] is not None and row['discrimination'] < 0.2:
+            return "⚠️ อำนาจจำแนกต่ำ"
+        if row['difficulty'] < 0.2:
+            return "ยากมาก"
+        if row['difficulty'] > 0.9:
+            return "ง่ายมาก"
+        return ""
+
+    st.dataframe([
+        {'ข้อ': row['item'], 'ค่าความยาก (p)': row['difficulty'], 'อำนาจจำแนก (r)': row['discrimination'],
+         'SD': row['sd'], 'หมายเหตุ': verdict(row)}
+        for row in stats.table()
+    ], width='stretch')
+
+    item = st.selectbox("ตัวลวง (ตัวเลือก / บล็อก Flowchart ที่ผิด)", sorted(stats.options), key="item_distractors")
+    if item:
+        accepted = set(ANSWER_KEY[item]['accept']) if item in ANSWER_KEY else set()
+        st.dataframe([
+            {'ตัวเลือก': option, 'ถูก': option in accepted, 'จำนวน': count, 'สัดส่วน': share,
+             'คะแนนรวมเฉลี่ยของผู้เลือก': mean_total}
+            for option, count, share, mean_total in stats.distractors(item)
+        ], width='stretch')
+
+def render_proctor_view():
+    st.title("📊 Proctor Dashboard")
+    pwd = st.text_input("รหัสผ่านผู้คุมสอบ:", type="password", key="proctor_pwd")
+    if pwd != ADMIN_PASSWORD:
+        if pwd:
+            st.error("รหัสผ่านผิด")
+        return
+
+    room, results, analysis, system = st.tabs(["ห้องสอบ", "ผลสอบทั้งห้อง", "วิเคราะห์ข้อสอบ", "ระบบ"])
+    with room:
+        live_cohort()
+        # Back to WAIT, e.g. after a rehearsal; with EXAM_STORE=sqlite the exam
+        # state outlives a restart, so this is the only way to clear it
+        with st.expander("รีเซ็ตการสอบ"):
+            sure = st.checkbox("ยืนยัน: ให้การสอบกลับไปสถานะรอสอบ (WAIT)")
+            if st.button("🔁 รีเซ็ตการสอบ", disabled=not sure):
+                coordinator.reset_exam()
+                st.rerun()
+    with results:
+        # Generated from the journal when a button is pressed, never on a rerun
+        st.caption("คำตอบของนักเรียนทุกคน พร้อมลำดับ Flowchart และคะแนนอัตโนมัติ")
+        stamp = time.strftime("%Y%m%d_%H%M")
+        st.download_button("📥 Parquet", lambda: export.export_bytes('parquet', scenarios.ANSWER_FIELDS),
+                           file_name=f"cohort_{stamp}.parquet", mime="application/vnd.apache.parquet")
+        st.download_button("📥 CSV", lambda: export.export_bytes('csv', scenarios.ANSWER_FIELDS),
+                           file_name=f"cohort_{stamp}.csv", mime="text/csv")
+        st.caption("คู่คำตอบอัตนัยที่คล้ายกันมาก (MinHash/LSH) สำหรับตรวจสอบการลอกคำตอบ")
+        st.download_button("📥 คำตอบที่คล้ายกัน (CSV)", similarity.similar_csv,
+                           file_name=f"similar_essays_{stamp}.csv", mime="text/csv")
+    with analysis:
+        live_items()
+        if st.button("🔄 คำนวณใหม่จาก journal"):
+            import outbox
+            item_analysis.rebuild(journal.get_journal(), outbox.get_outbox().latest_statuses())
+            st.rerun()
+    with system:
+        live_metrics()
+
+if st.query_params.get("view") == "proctor":
+    render_proctor_view()
+    st.stop()
+
 # ----------------------------------------------------
 # LOGIN
 # ----------------------------------------------------
@@ -140,7 +421,14 @@ if st.session_state.phase == 'LOGIN':
     if st.button("เข้าสู่ห้องรอสอบ"):
         if name.strip():
             st.session_state.answers['student_name'] = name.strip()
-            st.session_state.phase = 'WAIT'
+            saved = state_store.get_store().restore(name.strip())
+            if saved:
+                restore_session(saved)
+                report_position()
+            else:
+                st.session_state.phase = 'WAIT'
+                journal_answers()
+                journal_state()
             st.rerun()
 
 # ----------------------------------------------------
@@ -149,420 +437,161 @@ if st.session_state.phase == 'LOGIN':
 elif st.session_state.phase == 'WAIT':
     st.header(f"ยินดีต้อนรับ: {st.session_state.answers.get('student_name')}")
     st.warning("⏳ กรุณารอสัญญาณเริ่มสอบ...")
+    st.caption("หน้านี้จะเริ่มการสอบให้อัตโนมัติเมื่อผู้คุมสอบกดเริ่ม ไม่ต้องรีเฟรช")
+
+    # Only this fragment re-runs while waiting; the full script reruns when
+    # this student's prefetch is due and when the exam state flips to RUNNING.
+    if 'wait_entered' not in st.session_state:
+        st.session_state.wait_entered = time.time()
+
+    @st.fragment(run_every=WAIT_POLL_SECONDS)
+    def wait_for_start():
+        name = st.session_state.answers['student_name']
+        cohort.touch(name)
+        metrics.touch_session(name)
+        # Scenario 1 videos, each student at their own time (admission.prefetch_due);
+        # one full rerun puts them on the page, outside this fragment, once
+        if not st.session_state.get('prefetched') and admission.prefetch_due(name, st.session_state.wait_entered):
+            st.session_state.prefetched = True
+            st.rerun()
+        exam = coordinator.snapshot()
+        if exam.status == 'RUNNING':
+            st.session_state.current_scenario = exam.scenario
+            st.session_state.current_phase = exam.phase
+            st.session_state.phase = 'RUNNING'
+            journal_state()
+            st.rerun()
+
+    if st.session_state.get('prefetched'):
+        prefetch_media(scenarios.FIRST_VIDEOS)
+    wait_for_start()
+
     with st.expander("สำหรับผู้คุมสอบ (Proctor)"):
         pwd = st.text_input("รหัสผ่านเริ่มสอบ:", type="password")
         if st.button("Start Exam"):
             if pwd == ADMIN_PASSWORD:
-                st.session_state.current_scenario = 1
-                st.session_state.current_phase = 1
-                st.session_state.phase = 'RUNNING'
+                coordinator.start_exam()
                 st.rerun()
             else:
                 st.error("รหัสผ่านผิด")
-    if st.button("รีเฟรชสถานะ"):
-        st.rerun()
 
 # ----------------------------------------------------
 # MAIN EXAM
 # ----------------------------------------------------
 elif st.session_state.phase == 'RUNNING':
+    student = st.session_state.answers['student_name']
+    if not st.session_state.get('admitted'):
+        # Start-spike queue: one line of output until a slot frees (admission.py)
+        @st.fragment(run_every=WAIT_POLL_SECONDS)
+        def admission_queue():
+            place = admission.request(student)
+            if not place:
+                st.rerun()
+            cohort.touch(student)
+            metrics.touch_session(student)
+            st.info(f"⏳ กำลังเข้าสู่ห้องสอบ... ลำดับคิวที่ {place}")
+
+        if admission.request(student):
+            admission_queue()
+            st.stop()
+        # Time spent in the queue is not taken out of the first phase
+        st.session_state.setdefault('admitted_at', coordinator.now())
+
+    page_started = time.perf_counter()
     sc = st.session_state.current_scenario
     ph = st.session_state.current_phase
     current_key = (sc, ph)
 
-    # Auto-advance when time runs out (silent)
     time_key = f"start_time_s{sc}_p{ph}"
     if time_key not in st.session_state:
-        st.session_state[time_key] = time.time()
-    elapsed = time.time() - st.session_state[time_key]
-    remaining = PHASE_TIMES[ph] - elapsed
-    if remaining <= 0 and current_key not in st.session_state.locked_phases:
-        st.session_state.locked_phases.add(current_key)
-        if ph == 3:
-            if sc == 5:
-                st.session_state.phase = 'FINISH'
-            else:
-                st.session_state.current_scenario += 1
-                st.session_state.current_phase = 1
-        else:
-            st.session_state.current_phase += 1
-        st.rerun()
+        st.session_state[time_key] = max(coordinator.phase_anchor(sc, ph), st.session_state.get('admitted_at', 0))
+
+    # Countdown + auto-advance run in their own fragment, so ticking never
+    # re-executes the scenario rendering below.
+    @st.fragment(run_every=TIMER_TICK_SECONDS)
+    def phase_timer(sc, ph):
+        with section('timer'):
+            cohort.touch(student)
+            metrics.touch_session(student)
+            admission.touch(student)
+            anchor = st.session_state[f"start_time_s{sc}_p{ph}"]
+            remaining = coordinator.remaining(anchor, PHASE_TIMES[ph])
+            if remaining <= 0 and (sc, ph) not in st.session_state.locked_phases:
+                advance_phase(sc, ph, next_anchor=anchor + PHASE_TIMES[ph])
+                st.rerun()
+            mins, secs = divmod(max(0, int(remaining)), 60)
+            st.caption(f"⏱️ เวลาที่เหลือ {mins:02d}:{secs:02d}")
+
+    phase_timer(sc, ph)
 
     # Show PDF Fact Sheet (Scenarios 2-5)
     if sc in PDF_MAP:
-        pdf_file = PDF_MAP[sc]
-        if os.path.exists(pdf_file):
-            with open(pdf_file, "rb") as f:
-                st.download_button(
-                    label="📄 เปิด Medical Fact Sheet",
-                    data=f,
-                    file_name=pdf_file,
-                    mime="application/pdf"
-                )
+        fact_sheet(sc, PDF_MAP[sc])
 
     # Prevent editing if locked
     if current_key in st.session_state.locked_phases:
         st.warning("🔒 ส่วนนี้ส่งคำตอบแล้ว ไม่สามารถแก้ไขได้")
     else:
-        # ========================
-        # SCENARIO 1
-        # ========================
-        if sc == 1:
-            if ph == 1:
-                st.subheader("Scenario 1: ชาวสวนถูกหามส่งโรงพยาบาลด้วยอาการน้ำลายฟูมปาก...")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.info("VDO 1: อาการที่ขา")
-                    try:
-                        st.video("Question1_VDO1.mp4", loop=True, autoplay=True, muted=True)
-                    except:
-                        st.warning("ไม่พบไฟล์ VDO1")
-                with col2:
-                    st.info("VDO 2: อาการที่ตา")
-                    try:
-                        st.video("Question1_VDO2.mp4", loop=True, autoplay=True, muted=True)
-                    except:
-                        st.warning("ไม่พบไฟล์ VDO2")
-                st.divider()
-                st.markdown("### 1.1 จาก VDO 1 และ VDO 2 จงระบุชื่อเรียกทางการแพทย์ (Medical Term) ของอาการที่เกิดขึ้น")
-                col_vdo1, col_vdo2 = st.columns(2)
-                with col_vdo1:
-                    ans1_1 = st.text_input("VDO 1 (Leg):", key="s1_p1_vdo1")
-                with col_vdo2:
-                    ans1_2 = st.text_input("VDO 2 (Eye):", key="s1_p1_vdo2")
-                ans2 = st.radio("1.2 กลุ่มอาการดังกล่าว บ่งบอกถึงภาวะ Overstimulation ของระบบประสาทส่วนใด?",
-                                ["Sympathetic", "Parasympathetic", "Somatic", "Central"])
-                st.markdown("### 1.3 จงระบุชื่อ \"กลุ่มสารเคมี\" (Chemical Group) ที่เป็นสาเหตุที่เป็นไปได้มา 2 กลุ่ม")
-                col_chem1, col_chem2 = st.columns(2)
-                with col_chem1:
-                    ans3_1 = st.text_input("1.", key="s1_p1_chem1")
-                with col_chem2:
-                    ans3_2 = st.text_input("2.", key="s1_p1_chem2")
-                st.session_state.answers.update({
-                    's1_p1_vdo1': ans1_1,
-                    's1_p1_vdo2': ans1_2,
-                    's1_p1_system': ans2,
-                    's1_p1_chem1': ans3_1,
-                    's1_p1_chem2': ans3_2
-                })
-
-            elif ph == 2:
-                st.subheader("Scenario 1: Mechanism (Drag & Drop)")
-                st.info("จงลากกล่องข้อความมาวางเรียงลำดับ...")
-                blocks = [
-                    'Toxin absorption through skin/inhalation',
-                    'Inhibition of Acetylcholinesterase',
-                    'Acetylcholine accumulation in Synaptic Cleft',
-                    'Continuous stimulation of Muscarinic & Nicotinic Receptors',
-                    'Blockage of Acetylcholine Receptors',
-                    'Decreased production of Acetylcholine',
-                    'Irreversible activation of Acetylcholinesterase',
-                    'Massive release of Norepinephrine from Nerve endings',
-                    'Inhibition of Voltage-gated Calcium Channels',
-                    'Hyperpolarization of the Post-synaptic membrane'
-                ]
-                original_items = [{'header': 'ตัวเลือก', 'items': blocks}, {'header': 'คำตอบของคุณ', 'items': []}]
-                sorted_items = sort_items(original_items, multi_containers=True)
-                st.session_state.answers['s1_flowchart'] = sorted_items
-
-            elif ph == 3:
-                st.subheader("Scenario 1: Synthesis & Application")
-                st.markdown("**3.1** จงอธิบายกลไกการออกฤทธิ์ของ Atropine...")
-                essay1 = st.text_area("คำตอบ 3.1:", height=100, key="s1_essay1")
-                st.markdown("**3.2** ทำไม Atropine ถึง *ไม่ช่วย* แก้อาการกล้ามเนื้อกระตุก?")
-                essay2 = st.text_area("คำตอบ 3.2:", height=100, key="s1_essay2")
-                st.session_state.answers.update({'s1_essay1': essay1, 's1_essay2': essay2})
-
-        # ========================
-        # SCENARIO 2
-        # ========================
-        elif sc == 2:
-            if ph == 1:
-                st.subheader("Scenario 2: เด็กวัยรุ่นชาย อายุ 17 ปี หมดสติ หายใจหอบลึก...")
-                st.markdown("""
-                **ประวัติ**: ปัสสาวะบ่อยและน้ำหนักลดมา 1 เดือน  
-                **ผลตรวจทางห้องปฏิบัติการ**:  
-                - Glucose: 450 mg/dL  
-                - pH: 7.15  
-                - HCO₃⁻: 12 mEq/L  
-                - Ketone (Urine): Positive 4+  
-                """)
-                hormones = ["Insulin", "Glucagon", "Growth hormone", "Cortisol", "Catecholamine", "Aldosterone", "Vasopressin", "PTH"]
-                for i in range(3):
-                    cols = st.columns(3)
-                    h = cols[0].selectbox(f"ฮอร์โมน {i+1}", hormones, key=f"s2_h{i}")
-                    c = cols[1].radio("การเปลี่ยนแปลง", ["Increase", "Decrease"], key=f"s2_c{i}")
-                    m = cols[2].text_input("ผลที่เกิดขึ้น (Mechanism Key)", key=f"s2_m{i}")
-                    st.session_state.answers[f's2_hormone_{i}'] = h
-                    st.session_state.answers[f's2_change_{i}'] = c
-                    st.session_state.answers[f's2_mech_{i}'] = m
-
-            elif ph == 2:
-                st.subheader("Scenario 2: กลไกการเกิดเลือดเป็นกรด")
-                blocks = [
-                    'Absence of Insulin activity',
-                    'Cells cannot uptake Glucose',
-                    'Lipolysis / Fatty Acid Breakdown',
-                    'Liver produces Ketone Bodies',
-                    'Accumulation of Acid in Blood',
-                    'Increased Protein Synthesis',
-                    'Lactate fermentation (Anaerobic)',
-                    'Kidney retains Bicarbonate'
-                ]
-                original_items = [{'header': 'ตัวเลือก', 'items': blocks}, {'header': 'คำตอบของคุณ', 'items': []}]
-                sorted_items = sort_items(original_items, multi_containers=True)
-                st.session_state.answers['s2_flowchart'] = sorted_items
-
-            elif ph == 3:
-                st.subheader("Scenario 2: Synthesis")
-                st.markdown("**3.1** ... Kussmaul breathing ...")
-                e1 = st.text_area("คำตอบ 3.1:", height=80, key="s2_essay1")
-                st.markdown("**3.2** ... Hypokalemia ...")
-                e2 = st.text_area("คำตอบ 3.2:", height=80, key="s2_essay2")
-                st.session_state.answers.update({'s2_essay1': e1, 's2_essay2': e2})
-
-        # ========================
-        # SCENARIO 3
-        # ========================
-        elif sc == 3:
-            if ph == 1:
-                st.subheader("Scenario 3: เด็กชายอายุ 8 ปี มีอาการซีด เรื้อรัง ตัวเหลือง ตับและม้ามโต")
-                st.markdown("""
-                **ประวัติ**: พัฒนาการช้า  
-                **ผลตรวจเลือด**:  
-                - MCV: 65 fL  
-                - Hb: 6.0 g/dL  
-                - Hb typing: HbA2 10%, HbF 90%  
-                **Blood Smear**: Microcytic, Hypochromic, Target cells
-                """)
-                try:
-                    st.image("pedigree.jpg", caption="Pedigree Chart", use_column_width=True)
-                except:
-                    st.warning("⚠️ ไม่พบไฟล์ pedigree.jpg")
-                st.markdown("**คำสั่ง**: จงตอบคำถามต่อไปนี้")
-                diag = st.text_input("1. Diagnosis: ผู้ป่วยรายนี้เป็นโรคอะไร?", key="s3_diag")
-                inherit = st.radio("2. Inheritance Pattern: ...",
-                                   ["Autosomal dominant", "Autosomal recessive", "X-linked"], key="s3_inherit")
-                chance = st.text_input("3. Chance: ... (%)", key="s3_chance")
-                st.session_state.answers.update({
-                    's3_diagnosis': diag,
-                    's3_inheritance': inherit,
-                    's3_chance': chance
-                })
-
-            elif ph == 2:
-                st.subheader("Scenario 3: กลไกการเกิดโรคธาลัสซีเมีย")
-                correct = [
-                    'Genetic Mutation/Deletion',
-                    'Defective Globin chain synthesis',
-                    'Precipitation of excess Globin chains',
-                    'RBC Membrane damage & Hemolysis',
-                    'Chronic Hypoxia (Lack of oxygen)',
-                    'Extramedullary Hematopoiesis (Liver/Spleen enlargement)'
-                ]
-                distractors = [
-                    'Iron Deficiency from poor diet',
-                    'Autoimmune destroys RBC',
-                    'Polymerization of Hemoglobin S',
-                    'Defective Heme synthesis',
-                    'Bone marrow aplasia',
-                    'Deficiency of G6PD enzyme'
-                ]
-                all_blocks = correct + distractors
-                original_items = [{'header': 'ตัวเลือก', 'items': all_blocks}, {'header': 'คำตอบของคุณ', 'items': []}]
-                sorted_items = sort_items(original_items, multi_containers=True)
-                st.session_state.answers['s3_flowchart'] = sorted_items
-
-            elif ph == 3:
-                st.subheader("Scenario 3: Synthesis")
-                st.markdown("**3.1** ... เหล็กเกิน ...")
-                e1 = st.text_area("คำตอบ 3.1:", height=80, key="s3_essay1")
-                st.markdown("**3.2** ... CRISPR-Cas9 ...")
-                e2 = st.text_area("คำตอบ 3.2:", height=80, key="s3_essay2")
-                st.session_state.answers.update({'s3_essay1': e1, 's3_essay2': e2})
-
-        # ========================
-        # SCENARIO 4
-        # ========================
-        elif sc == 4:
-            if ph == 1:
-                st.subheader("Scenario 4: ชายชาวประมง ประสบเหตุเรืออับปาง...")
-                st.markdown("""
-                **Vital Signs**: BP 80/50 mmHg, Pulse 110 bpm  
-                **ผลตรวจร่างกาย**: ปากแห้งมาก, ปลายมือเท้าขาวซีดเย็น  
-                **Urine**: Specific Gravity 1.040  
-                **Blood Osmolarity**: 320 mOsm/L
-                """)
-
-                st.markdown("### 1. อาการหัวใจเต้นเร็ว... เกิดจากการตอบสนองของระบบประสาทส่วน ________ ร่วมกับฮอร์โมน ________ ซึ่งหลั่งจาก ________")
-
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    q1_system = st.text_input("1.1 ระบบประสาทส่วน", key="s4_q1_system")
-                with col2:
-                    q1_hormone = st.text_input("1.2 ฮอร์โมน", key="s4_q1_hormone")
-                with col3:
-                    q1_source = st.text_input("1.3 หลั่งจาก", key="s4_q1_source")
-
-                st.markdown("### 2. Kidney Function: ... เป็นผลจากฮอร์โมน ________ ซึ่งออกฤทธิ์ที่ ________")
-
-                col4, col5 = st.columns(2)
-                with col4:
-                    q2_hormone = st.text_input("2.1 ฮอร์โมน", key="s4_q2_hormone")
-                with col5:
-                    q2_site = st.text_input("2.2 ออกฤทธิ์ที่", key="s4_q2_site")
-
-                st.session_state.answers.update({
-                    's4_q1_system': q1_system,
-                    's4_q1_hormone': q1_hormone,
-                    's4_q1_source': q1_source,
-                    's4_q2_hormone': q2_hormone,
-                    's4_q2_site': q2_site
-                })
-
-            elif ph == 2:
-                st.subheader("Scenario 4: กลไกกู้ความดันโลหิต")
-                correct = [
-                    'Activation of Sympathetic Nervous System (Baroreceptor reflex)',
-                    'Adrenal Medulla releases Adrenaline',
-                    'Kidney secretes Renin & Angiotensin II formation',
-                    'General Vasoconstriction & Increased Heart Rate',
-                    'Adrenal Cortex secretes Aldosterone',
-                    'Increased Na+ & Water Reabsorption at Kidney'
-                ]
-                distractors = [
-                    'Increased Secretion of Atrial Natriuretic Peptide',
-                    'Stimulation of Vagus Nerve (Parasympathetic)',
-                    'Dilation of Peripheral Blood Vessels',
-                    'Inhibition of ADH (Vasopressin) release',
-                    'Increased Potassium Reabsorption',
-                    'Increased Urine Output'
-                ]
-                all_blocks = correct + distractors
-                original_items = [{'header': 'ตัวเลือก', 'items': all_blocks}, {'header': 'คำตอบของคุณ', 'items': []}]
-                sorted_items = sort_items(original_items, multi_containers=True)
-                st.session_state.answers['s4_flowchart'] = sorted_items
-
-            elif ph == 3:
-                st.subheader("Scenario 4: Synthesis")
-                st.markdown("**3.1** ... ดื่มน้ำทะเล ...")
-                e1 = st.text_area("คำตอบ 3.1:", height=80, key="s4_essay1")
-                st.markdown("**3.2** ... เลือกสารน้ำ ...")
-                options = ["Normal saline (0.9% NaCl)", "0.45% NaCl", "5% Dextrose/Water", "Plasma", "Whole blood"]
-                choice = st.selectbox("เลือกสารน้ำ:", options, key="s4_fluid_choice")
-                reason = st.text_area("เหตุผล:", height=80, key="s4_reason")
-                st.session_state.answers.update({'s4_essay1': e1, 's4_choice': choice, 's4_reason': reason})
-
-        # ========================
-        # SCENARIO 5
-        # ========================
-        elif sc == 5:
-            if ph == 1:
-                st.subheader("Scenario 5: นายเอ ถูกสุนัขจรจัดกัด...")
-                st.markdown("""
-                **แพทย์สั่งจ่ายยา 4 ชนิด**:  
-                1. Rabies Vaccine  
-                2. Rabies Immunoglobulin  
-                3. Tetanus Toxoid  
-                4. Tetanus Antitoxin
-                """)
-                # Rabies Vaccine
-                rv_type = st.radio("Rabies Vaccine - ประเภทภูมิคุ้มกัน", ["Active", "Passive"], key="rv_type")
-                rv_role = st.radio("Rabies Vaccine - หน้าที่หลัก", ["Immediate Neutralization", "Long-term Memory"], key="rv_role")
-                # Rabies Immunoglobulin
-                rig_type = st.radio("Rabies Immunoglobulin - ประเภทภูมิคุ้มกัน", ["Active", "Passive"], key="rig_type")
-                rig_role = st.radio("Rabies Immunoglobulin - หน้าที่หลัก", ["Immediate Neutralization", "Long-term Memory"], key="rig_role")
-                # Tetanus Toxoid
-                tt_type = st.radio("Tetanus Toxoid - ประเภทภูมิคุ้มกัน", ["Active", "Passive"], key="tt_type")
-                tt_role = st.radio("Tetanus Toxoid - หน้าที่หลัก", ["Immediate Neutralization", "Long-term Memory"], key="tt_role")
-                # Tetanus Antitoxin
-                tat_type = st.radio("Tetanus Antitoxin - ประเภทภูมิคุ้มกัน", ["Active", "Passive"], key="tat_type")
-                tat_role = st.radio("Tetanus Antitoxin - หน้าที่หลัก", ["Immediate Neutralization", "Long-term Memory"], key="tat_role")
-                st.session_state.answers.update({
-                    's5_rv_type': rv_type, 's5_rv_role': rv_role,
-                    's5_rig_type': rig_type, 's5_rig_role': rig_role,
-                    's5_tt_type': tt_type, 's5_tt_role': tt_role,
-                    's5_tat_type': tat_type, 's5_tat_role': tat_role
-                })
-
-            elif ph == 2:
-                st.subheader("Scenario 5: กลไกการป้องกันโรคพิษสุนัขบ้า")
-                correct = [
-                    'Rabies Virus enters the wound',
-                    'Rabies Immunoglobulin binds and neutralizes virus at the wound site',
-                    'Rabies vaccine stimulates Antigen Presenting Cells',
-                    'Activation of Helper T-Cells & B-Cells',
-                    'Production of specific Antibodies',
-                    'Long-term protection against virus'
-                ]
-                distractors = [
-                    'Tetanus Vaccine destroys virus immediately',
-                    'Rabies Immunoglobulin creates Memory Cells',
-                    'Tetanus Toxoid kills Rabies virus',
-                    'Tetanus antitoxin activates Helper T-Cells & B-Cells'
-                ]
-                all_blocks = correct + distractors
-                original_items = [{'header': 'ตัวเลือก', 'items': all_blocks}, {'header': 'คำตอบของคุณ', 'items': []}]
-                sorted_items = sort_items(original_items, multi_containers=True)
-                st.session_state.answers['s5_flowchart'] = sorted_items
-
-            elif ph == 3:
-                st.subheader("Scenario 5: Synthesis & Application")
-                st.markdown("**3.1** ... RIG ที่แผล ...")
-                e1 = st.text_area("คำตอบ 3.1:", height=80, key="s5_essay1")
-                st.markdown("**3.2** ... ไม่ฉีด TAT ...")
-                e2 = st.text_area("คำตอบ 3.2:", height=80, key="s5_essay2")
-                st.session_state.answers.update({'s5_essay1': e1, 's5_essay2': e2})
+        render_phase(sc, ph)
 
         # --- ปุ่ม Next Session ---
         if st.button("⏭️ Next Session", key=f"next_btn_{sc}_{ph}"):
-            st.session_state.locked_phases.add(current_key)
-            if ph == 3:
-                if sc == 5:
-                    st.session_state.phase = 'FINISH'
-                else:
-                    st.session_state.current_scenario += 1
-                    st.session_state.current_phase = 1
-            else:
-                st.session_state.current_phase += 1
+            advance_phase(sc, ph, next_anchor=coordinator.now())
             st.rerun()
 
+    # Whole-script reruns only; fragment reruns are timed by their sections
+    metrics.observe('section_seconds', time.perf_counter() - page_started, section='page', scenario=sc, phase=ph)
+    if not st.session_state.get('admitted'):
+        st.session_state.admitted = True
+        admission.started(student)
+
 # ----------------------------------------------------
 # FINISH
 # ----------------------------------------------------
 elif st.session_state.phase == 'FINISH':
+    import outbox
+    admission.leave(st.session_state.answers['student_name'])
+
     st.balloons()
     st.success("✅ ส่งข้อสอบเรียบร้อย!")
 
-    # Submit to Google Form
-    def submit_to_google_form(data, form_id, field_mapping):
-        url = f"https://docs.google.com/forms/d/e/{form_id}/formResponse"
-        payload = {}
-        for key, value in data.items():
-            if key in field_mapping:
-                payload[field_mapping[key]] = str(value)
-        try:
-            response = requests.post(url, data=payload)
-            return response.status_code == 200
-        except Exception as e:
-            st.error(f"ส่งคำตอบล้มเหลว: {e}")
-            return False
-
-    if st.button("📤 ส่งคำตอบไปยังผู้คุมสอบ"):
-        if submit_to_google_form(st.session_state.answers, FORM_ID, FIELD_MAPPING):
+    # One form response per student: the button stays off once a submission is queued
+    sent = outbox.get_outbox().delivery_state(st.session_state.answers.get('student_name', ''))
+    if st.button("📤 ส่งคำตอบไปยังผู้คุมสอบ", disabled=sent is not None and sent['status'] != outbox.FAILED):
+        job = submit_to_google_form(st.session_state.answers, FORM_ID, FIELD_MAPPING)
+        cohort.mark_submitted(st.session_state.answers.get('student_name', ''), job)
+        item_analysis.record_later(st.session_state.answers.get('student_name', ''), st.session_state.answers)
+
+    # Delivery happens in the background; poll the outbox for this student
+    @st.fragment(run_every=OUTBOX_POLL_SECONDS)
+    def delivery_status():
+        metrics.touch_session(st.session_state.answers.get('student_name', ''))
+        state = outbox.get_outbox().delivery_state(st.session_state.answers.get('student_name', ''))
+        if state is None:
+            return
+        if state['status'] == outbox.DELIVERED:
             st.success("✅ ส่งคำตอบเรียบร้อย!")
-        else:
+        elif state['status'] == outbox.FAILED:
             st.error("❌ ส่งไม่สำเร็จ กรุณาลองใหม่")
+        else:
+            st.info(f"⏳ กำลังส่งคำตอบ... (ครั้งที่ {state['attempts'] + 1})")
+
+    delivery_status()
 
     # Show results
     st.json(st.session_state.answers)
 
-    # Download CSV (backup)
-    df = pd.DataFrame([st.session_state.answers])
-    csv = df.to_csv(index=False).encode('utf-8')
+    # Download CSV (backup), built only when the button is pressed
+    answers = dict(st.session_state.answers)
     st.download_button(
         label="📥 ดาวน์โหลดผลสอบ (CSV)",
-        data=csv,
+        data=lambda: export.student_csv(answers, scenarios.ANSWER_FIELDS),
         file_name=f"{st.session_state.answers.get('student_name', 'student')}_results.csv",
         mime="text/csv"
-    )
\ No newline at end of file
+    )
+
+# Bytes this session holds, once per whole-script rerun
+if st.session_state.answers.get('student_name'):
+    metrics.record_session_bytes(
+        st.session_state.answers['student_name'],
+        len(json.dumps(st.session_state.to_dict(), default=str, ensure_ascii=False).encode('utf-8')))
\ No newline at end of file
@@ -0,0 +1,74 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import namedtuple
+
+# ==========================================
+# SHARED ASSET STORE
+# ==========================================
+# Streamlit re-executes app.py for every session on every rerun, but imported
+# modules are loaded once per process. Assets kept here are read from disk once
+# and the same bytes object is handed to every session, so the media file
+# manager sees identical content (same file id / URL) for all students.
+
+Asset = namedtuple('Asset', ['path', 'data', 'sha256', 'mime', 'size', 'mtime_ns'])
+
+_assets = {}
+_lock = threading.Lock()
+_stats = {'loads': 0, 'hits': 0, 'invalidations': 0}
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_asset(path):
+    """Return the cached Asset for `path`, or None if the file does not exist.
+
+    The file is re-read only when its mtime or size on disk changes.
+    """
+    stamp = _stamp(path)
+    if stamp is None:
+        with _lock:
+            _assets.pop(path, None)
+        return None
+
+    asset = _assets.get(path)
+    if asset is not None and (asset.mtime_ns, asset.size) == stamp:
+        _stats['hits'] += 1
+        return asset
+
+    with _lock:
+        # Another session may have loaded it while we waited for the lock
+        asset = _assets.get(path)
+        if asset is not None and (asset.mtime_ns, asset.size) == stamp:
+            _stats['hits'] += 1
+            return asset
+        if asset is not None:
+            _stats['invalidations'] += 1
+
+        with open(path, "rb") as f:
+            data = f.read()
+        mime = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        asset = Asset(path, data, hashlib.sha256(data).hexdigest(), mime, len(data), stamp[0])
+        _assets[path] = asset
+        _stats['loads'] += 1
+        return asset
+
+
+def preload(paths):
+    for path in paths:
+        get_asset(path)
+
+
+def asset_stats():
+    return {
+        'files': len(_assets),
+        'bytes': sum(a.size for a in _assets.values()),
+        **_stats,
+    }
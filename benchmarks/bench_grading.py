@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grade_cache  # noqa: E402
+import grading  # noqa: E402
+
+# ==========================================
+# GRADING THROUGHPUT BENCHMARK (offline)
+# ==========================================
+# Pushes N essays through GradingPool backed by grading.FakeModel and compares
+# against the old one-call-at-a-time path.
+#
+#   python benchmarks/bench_grading.py --jobs 200 --workers 16 --rate 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AI grading throughput benchmark")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=grading.GRADING_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=20.0, help="token bucket calls/sec")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model seconds per call")
+    parser.add_argument("--quota-every", type=int, default=25, help="fail every Nth call with a 429")
+    parser.add_argument("--sequential", action="store_true", help="also time the blocking path")
+    parser.add_argument("--cache", default=None, help="grade cache path; runs the cohort twice")
+    args = parser.parse_args()
+
+    answers = [(f"Question {i % 10}", f"student answer {i}", "keywords") for i in range(args.jobs)]
+
+    if args.sequential:
+        model = grading.FakeModel(latency=args.latency)
+        started = time.perf_counter()
+        for q, a, r in answers:
+            grading.grade_answer(model, q, a, r)
+        seq = time.perf_counter() - started
+        print(f"sequential:  {seq:.2f}s  ({args.jobs / seq:.1f} answers/s)")
+
+    cache = grade_cache.GradeCache(args.cache) if args.cache else None
+    for attempt in range(2 if cache else 1):
+        if cache:
+            print(f"-- pass {attempt + 1}")
+        run_pool(args, answers, cache)
+    if cache:
+        print(f"cache:       {cache.stats()}")
+
+
+def run_pool(args, answers, cache):
+    model = grading.FakeModel(latency=args.latency, quota_every=args.quota_every)
+    pool = grading.GradingPool(model, max_workers=args.workers, rate_per_sec=args.rate,
+                               burst=args.burst, backoff_base=0.2, backoff_max=2.0, cache=cache)
+    started = time.perf_counter()
+    job_ids = [pool.submit(q, a, r) for q, a, r in answers]
+    submitted = time.perf_counter() - started
+    for job_id in job_ids:
+        pool.result(job_id)
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+
+    final = pool.progress()
+    retries = sum(max(0, pool.collect(j)['attempts'] - 1) for j in job_ids)
+    print(f"pool:        {elapsed:.2f}s  ({len(answers) / elapsed:.1f} answers/s)"
+          f"  workers={args.workers} rate={args.rate}/s")
+    print(f"submit time: {submitted * 1000:.1f} ms for {len(answers)} jobs")
+    print(f"model calls: {model.calls}  retries after 429: {retries}  final: {final}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import statistics
+
+from stclient import StreamlitClient, run, start_server
+
+# ==========================================
+# KEYSTROKE BENCHMARK
+# ==========================================
+# Logs one student in, starts the exam and types into a Scenario 1 Phase 1
+# field (the phase with both videos). Reports how many keystrokes caused a
+# full-script rerun and the round-trip time per keystroke.
+#
+#   python benchmarks/bench_keystroke.py --keystrokes 50
+#   git worktree add /tmp/before <rev> && \
+#       python benchmarks/bench_keystroke.py --app-dir /tmp/before
+
+
+async def bench(port, password, field, keystrokes):
+    c = StreamlitClient(port)
+    await c.connect()
+    c.set_value("โรงเรียน / Student ID:", "bench-student")
+    await c.click("เข้าสู่ห้องรอสอบ")
+    c.set_value("รหัสผ่านเริ่มสอบ:", password)
+    await c.click("Start Exam")
+
+    results = []
+    text = ""
+    for i in range(keystrokes):
+        text += "abcdefghij"[i % 10]
+        results.append(await c.type(field, text))
+    await c.close()
+    return results
+
+
+def report(results):
+    ms = sorted(r.seconds * 1000 for r in results)
+    full = sum(r.full for r in results)
+    print(f"keystrokes:            {len(results)}")
+    print(f"full-script reruns:    {full}")
+    print(f"fragment-only reruns:  {len(results) - full}")
+    print(f"ms/keystroke  mean:    {statistics.mean(ms):.1f}")
+    print(f"              p50:     {ms[len(ms) // 2]:.1f}")
+    print(f"              p95:     {ms[min(len(ms) - 1, int(len(ms) * 0.95))]:.1f}")
+    print(f"deltas/keystroke:      {statistics.mean(r.deltas for r in results):.1f}")
+    print(f"bytes/keystroke:       {statistics.mean(r.bytes for r in results):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-keystroke rerun benchmark")
+    parser.add_argument("--app-dir", default=None, help="checkout to benchmark (default: this repo)")
+    parser.add_argument("--field", default="s1_p1_vdo1")
+    parser.add_argument("--keystrokes", type=int, default=50)
+    parser.add_argument("--password", default="bench")
+    args = parser.parse_args()
+
+    kwargs = {'env': {'ADMIN_PASSWORD': args.password}}
+    if args.app_dir:
+        kwargs['cwd'] = args.app_dir
+    proc, port = start_server(**kwargs)
+    try:
+        report(run(bench(port, args.password, args.field, args.keystrokes)))
+    finally:
+        proc.kill()
+
+
+if __name__ == "__main__":
+    main()
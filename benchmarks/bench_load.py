@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_form import FakeForm  # noqa: E402
+from flowchart import ANSWER_HEADER, OPTIONS_HEADER, FLOWCHARTS, flowchart_blocks  # noqa: E402
+from stclient import StreamlitClient, start_server  # noqa: E402
+
+# ==========================================
+# CONCURRENT STUDENT LOAD TEST
+# ==========================================
+# N headless students go through one `streamlit run app.py` process together:
+# LOGIN -> WAIT (until a proctor client starts the exam) -> all 5 scenarios x
+# 3 phases, answering every widget including the sort_items flowcharts ->
+# FINISH -> send. Runs offline: no GOOGLE_API_KEY (grading returns the
+# no-model result) and a local form stand-in that records the submissions.
+#
+# Reports rerun latency percentiles per action, server RSS (baseline, peak,
+# per session) and throughput. --json appends one line per run to a file, so
+# capacity can be tracked over time.
+#
+#   python benchmarks/bench_load.py --students 50
+#   python benchmarks/bench_load.py --students 100 --ramp 10 --think 0.2 --json load.jsonl
+
+PASSWORD = "load-test"
+SKIP_KEYS = ('next_btn_',)
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class Student:
+
+    def __init__(self, port, name, rng, think, samples):
+        self.client = StreamlitClient(port)
+        self.name = name
+        self.rng = rng
+        self.think = think
+        self.samples = samples  # action -> [seconds]
+
+    async def act(self, action, coro):
+        result = await coro
+        self.samples[action].append(result.seconds)
+        await self.pause()
+        return result
+
+    async def pause(self):
+        # Fire due run_every timers while "thinking", as a browser would
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+        for result in await self.client.poll():
+            self.samples['timer'].append(result.seconds)
+
+    async def login(self):
+        c = self.client
+        self.samples['connect'].append((await c.connect()).seconds)
+        c.set_value("โรงเรียน / Student ID:", self.name)
+        await self.act('login', c.click("เข้าสู่ห้องรอสอบ"))
+
+    async def wait_for_start(self, timeout):
+        deadline = time.monotonic() + timeout
+        while 'next_btn_1_1' not in self.client.widgets:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{self.name} never left the waiting room")
+            await asyncio.sleep(0.05)
+            for result in await self.client.poll():
+                self.samples['timer'].append(result.seconds)
+
+    def answer_for(self, widget, sc):
+        if widget.kind == 'component_instance':
+            # sort_items: drag a few blocks (mostly right, in a mostly right order)
+            blocks = flowchart_blocks(sc)
+            k = len(FLOWCHARTS[sc]['correct'])
+            chosen = blocks[:k] + self.rng.sample(blocks[k:], 1)
+            if self.rng.random() < 0.3:
+                self.rng.shuffle(chosen)
+            rest = [b for b in blocks if b not in chosen]
+            return [{'header': OPTIONS_HEADER, 'items': rest}, {'header': ANSWER_HEADER, 'items': chosen}]
+        if widget.options:
+            return self.rng.choice(widget.options)
+        words = self.rng.randint(3, 40) if widget.kind == 'text_area' else self.rng.randint(1, 3)
+        return " ".join(self.rng.choice(["ATP", "insulin", "receptor", "ไต", "ฮอร์โมน", "เซลล์"]) for _ in range(words))
+
+    async def answer_phase(self, sc, ph):
+        c = self.client
+        seen = set()
+        for key, widget in list(c.widgets.items()):
+            if widget.id in seen or key.startswith(SKIP_KEYS) or widget.kind not in (
+                    'text_input', 'text_area', 'radio', 'selectbox', 'component_instance'):
+                continue
+            seen.add(widget.id)
+            if widget.label == "รหัสผ่านเริ่มสอบ:":
+                continue
+            c.set_value(key, self.answer_for(widget, sc))
+            action = 'flowchart' if widget.kind == 'component_instance' else 'answer'
+            await self.act(action, c.rerun(fragment_id=widget.fragment_id))
+        await self.act('next', c.click(f"next_btn_{sc}_{ph}"))
+
+    async def finish(self, timeout):
+        c = self.client
+        await self.act('send', c.click("📤 ส่งคำตอบไปยังผู้คุมสอบ"))
+        deadline = time.monotonic() + timeout
+        while "ส่งคำตอบเรียบร้อย!" not in c.texts:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{self.name}: submission not delivered")
+            await asyncio.sleep(0.05)
+            for result in await c.poll():
+                self.samples['timer'].append(result.seconds)
+
+
+async def proctor_start(port, ready, expected, samples):
+    proctor = StreamlitClient(port)
+    await proctor.connect()
+    proctor.set_value("โรงเรียน / Student ID:", "proctor")
+    await proctor.click("เข้าสู่ห้องรอสอบ")
+    while ready[0] < expected:
+        await asyncio.sleep(0.05)
+    proctor.set_value("รหัสผ่านเริ่มสอบ:", PASSWORD)
+    result = await proctor.click("Start Exam")
+    samples['start_exam'].append(result.seconds)
+    await proctor.close()
+
+
+async def simulate(port, args, samples, rss, server_pid):
+    ready = [0]
+    done = [0]
+    marks = {}
+
+    async def one(i):
+        rng = random.Random(args.seed + i)
+        await asyncio.sleep(args.ramp * i / max(1, args.students))
+        s = Student(port, f"load-{i:04d}", rng, args.think, samples)
+        await s.login()
+        ready[0] += 1
+        await s.wait_for_start(args.timeout)
+        marks.setdefault('exam_started', time.perf_counter())
+        for sc in range(1, 6):
+            for ph in range(1, 4):
+                await s.answer_phase(sc, ph)
+        await s.finish(args.timeout)
+        done[0] += 1
+        await s.client.close()
+
+    async def sample_rss():
+        while done[0] < args.students:
+            rss['peak'] = max(rss['peak'], rss_bytes(server_pid))
+            if ready[0] == args.students and 'all_waiting' not in rss:
+                rss['all_waiting'] = rss_bytes(server_pid)
+            await asyncio.sleep(0.2)
+
+    started = time.perf_counter()
+    sampler = asyncio.create_task(sample_rss())
+    await asyncio.gather(proctor_start(port, ready, args.students, samples),
+                         *(one(i) for i in range(args.students)))
+    finished = time.perf_counter()
+    await sampler
+    rss['end'] = rss_bytes(server_pid)
+    return started, marks.get('exam_started', started), finished
+
+
+def report(args, samples, rss, started, exam_started, finished, answered):
+    all_runs = sorted(s for v in samples.values() for s in v)
+    print(f"students:            {args.students} (ramp {args.ramp}s, think {args.think}s)")
+    print(f"reruns:              {len(all_runs)}")
+    print(f"{'action':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = {}
+    for action in sorted(samples) + ['ALL']:
+        values = all_runs if action == 'ALL' else sorted(samples[action])
+        ms = [v * 1000 for v in values]
+        rows[action] = {'n': len(ms), 'p50': percentile(ms, 0.5), 'p95': percentile(ms, 0.95),
+                        'p99': percentile(ms, 0.99), 'max': ms[-1] if ms else 0.0}
+        r = rows[action]
+        print(f"{action:<12}{r['n']:>7}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}")
+
+    exam_seconds = finished - exam_started
+    # Sessions sitting in WAIT hold only their own state; the peak also
+    # includes modules first imported mid-exam (sortables, pandas, outbox)
+    per_session = (rss.get('all_waiting', rss['baseline']) - rss['baseline']) / max(1, args.students)
+    peak_per_student = (rss['peak'] - rss['baseline']) / max(1, args.students)
+    print(f"server RSS:          baseline {rss['baseline'] / 2**20:.0f} MiB, "
+          f"all waiting {rss.get('all_waiting', 0) / 2**20:.0f} MiB, peak {rss['peak'] / 2**20:.0f} MiB, "
+          f"end {rss['end'] / 2**20:.0f} MiB")
+    print(f"memory per session:  {per_session / 2**10:.0f} KiB waiting, "
+          f"{peak_per_student / 2**10:.0f} KiB peak growth per student")
+    print(f"throughput:          {len(all_runs) / (finished - started):.1f} reruns/s, "
+          f"{args.students / exam_seconds * 60:.1f} students/min through the exam")
+    filled = statistics.mean(answered) if answered else 0
+    print(f"delivered:           {len(answered)}/{args.students} submissions at the form stand-in, "
+          f"{filled:.0f} answered fields each")
+    print(f"wall time:           {finished - started:.1f}s (exam {exam_seconds:.1f}s)")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps({
+                'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'students': args.students,
+                'ramp': args.ramp, 'think': args.think, 'latency_ms': rows,
+                'rss_bytes': rss, 'session_bytes': per_session, 'peak_bytes_per_student': peak_per_student,
+                'reruns_per_s': len(all_runs) / (finished - started),
+                'students_per_min': args.students / exam_seconds * 60, 'delivered': len(answered),
+            }) + "\n")
+
+
+async def warm_up(port):
+    client = StreamlitClient(port)
+    await client.connect()
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent student load test for app.py")
+    parser.add_argument("--app-dir", default=None, help="checkout to test (default: this repo)")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which students log in")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between actions, seconds")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="append a JSON result line to this file")
+    args = parser.parse_args()
+
+    form = FakeForm(latency=0.05).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            'ADMIN_PASSWORD': PASSWORD,
+            'GOOGLE_API_KEY': '',
+            'FORM_SUBMIT_URL': form.url,
+            'WAIT_POLL_SECONDS': '0.5',
+            'OUTBOX_POLL_SECONDS': '0.5',
+            'JOURNAL_PATH': os.path.join(tmp, 'journal.sqlite3'),
+            'OUTBOX_PATH': os.path.join(tmp, 'outbox.sqlite3'),
+            'GRADE_CACHE_PATH': os.path.join(tmp, 'grade_cache.sqlite3'),
+        }
+        kwargs = {'env': env}
+        if args.app_dir:
+            kwargs['cwd'] = args.app_dir
+        proc, port = start_server(**kwargs)
+        try:
+            # One throwaway session so imports and asset preloading are in the baseline
+            asyncio.run(warm_up(port))
+            time.sleep(0.5)
+            rss = {'baseline': rss_bytes(proc.pid), 'peak': 0}
+            samples = defaultdict(list)
+            started, exam_started, finished = asyncio.run(simulate(port, args, samples, rss, proc.pid))
+        finally:
+            proc.kill()
+            form.stop()
+    # Non-empty form fields per delivered submission (sanity check that answers arrived)
+    answered = [sum(1 for v in sub.values() if v and v[0].strip()) for sub in form.received]
+    report(args, samples, rss, started, exam_started, finished, answered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbox  # noqa: E402
+from fake_form import FakeForm  # noqa: E402
+
+# ==========================================
+# OUTBOX DELIVERY BENCHMARK (offline)
+# ==========================================
+# A whole room presses "send" at once against a flaky local form endpoint.
+#
+#   python benchmarks/bench_outbox.py --students 200 --fail-rate 0.2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submission outbox benchmark")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=outbox.OUTBOX_CONCURRENCY)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    form = FakeForm(latency=args.latency, fail_rate=args.fail_rate).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        box = outbox.Outbox(os.path.join(tmp, "outbox.sqlite3"), concurrency=args.concurrency,
+                            backoff_base=0.1, backoff_max=1.0, poll_interval=0.05).start()
+        answers = {'student_name': '', 's1_essay1': 'x' * 500}
+        mapping = {'student_name': 'entry.1', 's1_essay1': 'entry.2'}
+
+        started = time.perf_counter()
+        for i in range(args.students):
+            answers['student_name'] = f"student-{i}"
+            box.enqueue(answers['student_name'], form.url, outbox.build_payload(answers, mapping))
+        enqueued = time.perf_counter() - started
+
+        while True:
+            counts = box.counts()
+            if counts[outbox.PENDING] == 0 and counts[outbox.SENDING] == 0:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        box.stop()
+    form.stop()
+
+    print(f"enqueue:   {enqueued * 1000:.1f} ms for {args.students} students "
+          f"({enqueued / args.students * 1e6:.0f} us each)")
+    print(f"delivered: {counts[outbox.DELIVERED]}/{args.students} in {elapsed:.2f}s, failed={counts[outbox.FAILED]}")
+    print(f"POSTs:     {form.attempts} (fail rate {args.fail_rate}), concurrency={args.concurrency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# ==========================================
+# STARTUP BENCHMARK
+# ==========================================
+# Measures, in a fresh interpreter: how long `import streamlit` takes, the
+# first (cold) render of the LOGIN page including app.py's own imports, and a
+# warm rerun. Also lists heavy dependencies that got imported just to show
+# LOGIN. Non-zero exit when a limit is exceeded, so it can gate CI.
+#
+#   python benchmarks/bench_startup.py --max-first-render-ms 1500 --forbid-heavy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'google.generativeai', 'streamlit_sortables', 'requests']
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+t1 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+baseline = set(sys.modules)
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+t2 = time.perf_counter()
+at.run()
+t3 = time.perf_counter()
+at.run()
+t4 = time.perf_counter()
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules and m not in baseline]
+print(json.dumps({
+    'import_streamlit_ms': (t1 - t0) * 1000,
+    'first_render_ms': (t3 - t2) * 1000,
+    'warm_rerun_ms': (t4 - t3) * 1000,
+    'heavy_loaded_at_login': heavy,
+    'exception': [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def measure(app_dir, runs):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ,
+               'JOURNAL_PATH': os.path.join(tmp, 'journal.sqlite3'),
+               'OUTBOX_PATH': os.path.join(tmp, 'outbox.sqlite3'),
+               'GRADE_CACHE_PATH': os.path.join(tmp, 'grade_cache.sqlite3')}
+        for _ in range(runs):
+            out = subprocess.run(
+                [sys.executable, "-c", PROBE, os.path.join(app_dir, "app.py"), json.dumps(HEAVY_MODULES)],
+                cwd=app_dir, env=env, capture_output=True, text=True, check=True,
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for app.py")
+    parser.add_argument("--app-dir", default=ROOT)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-first-render-ms", type=float, default=None)
+    parser.add_argument("--forbid-heavy", action="store_true",
+                        help="fail if a heavy dependency is imported to render LOGIN")
+    args = parser.parse_args()
+
+    results = measure(args.app_dir, args.runs)
+    best = {k: min(r[k] for r in results) for k in ('import_streamlit_ms', 'first_render_ms', 'warm_rerun_ms')}
+    heavy = results[-1]['heavy_loaded_at_login']
+    print(f"import streamlit:   {best['import_streamlit_ms']:.0f} ms")
+    print(f"first render (cold): {best['first_render_ms']:.0f} ms")
+    print(f"warm rerun:         {best['warm_rerun_ms']:.0f} ms")
+    print(f"heavy modules at LOGIN: {', '.join(heavy) or 'none'}")
+    if results[-1]['exception']:
+        print(f"app raised: {results[-1]['exception']}")
+        sys.exit(1)
+
+    failed = False
+    if args.max_first_render_ms is not None and best['first_render_ms'] > args.max_first_render_ms:
+        print(f"FAIL: first render above {args.max_first_render_ms:.0f} ms")
+        failed = True
+    if args.forbid_heavy and heavy:
+        print("FAIL: heavy modules imported before they are needed")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
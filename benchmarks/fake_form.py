@@ -0,0 +1,66 @@
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# ==========================================
+# LOCAL GOOGLE FORM STAND-IN
+# ==========================================
+# Accepts formResponse POSTs like Google Forms does, with configurable
+# latency and failure rate. Run it and point the app at it:
+#
+#   python benchmarks/fake_form.py --port 8765 --fail-rate 0.2
+#   FORM_SUBMIT_URL=http://127.0.0.1:8765/formResponse streamlit run app.py
+
+
+class FakeForm:
+
+    def __init__(self, port=0, latency=0.05, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.received = []
+        self.attempts = 0
+        self.lock = threading.Lock()
+        form = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                time.sleep(form.latency)
+                with form.lock:
+                    form.attempts += 1
+                    fail = random.random() < form.fail_rate
+                    if not fail:
+                        form.received.append(parse_qs(body))
+                self.send_response(500 if fail else 200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/formResponse"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Google Form stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    form = FakeForm(args.port, args.latency, args.fail_rate)
+    print(f"listening on {form.url}")
+    form.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+# ==========================================
+# HEADLESS STREAMLIT CLIENT
+# ==========================================
+# Speaks the browser's websocket protocol (/_stcore/stream) against a real
+# `streamlit run` server, so benchmarks see true fragment-scoped reruns,
+# run_every timers and per-session server memory.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RunResult = namedtuple('RunResult', ['seconds', 'full', 'deltas', 'bytes'])
+Widget = namedtuple('Widget', ['id', 'kind', 'label', 'fragment_id', 'options'])
+
+_VALUE_FIELDS = {
+    'text_input': 'string_value',
+    'text_area': 'string_value',
+    'radio': 'string_value',
+    'selectbox': 'string_value',
+    'component_instance': 'json_value',
+}
+_FINISHED_EARLY_FOR_RERUN = ForwardMsg.DESCRIPTOR.fields_by_name['script_finished'] \
+    .enum_type.values_by_name['FINISHED_EARLY_FOR_RERUN'].number
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app="app.py", port=None, env=None, cwd=ROOT):
+    """Launch `streamlit run` in a subprocess and wait until it accepts connections."""
+    port = port or free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app,
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        cwd=cwd, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit server did not start")
+
+
+class StreamlitClient:
+
+    def __init__(self, port):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.ws = None
+        self.widgets = {}      # label or key -> Widget, from the latest run
+        self.values = {}       # widget id -> WidgetState we keep re-sending
+        self.auto_reruns = {}  # fragment id -> (interval, next due time)
+        self.texts = []
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    def set_value(self, label, value):
+        w = self.widgets[label]
+        state = WidgetState(id=w.id)
+        field = _VALUE_FIELDS[w.kind]
+        if field == 'json_value':
+            value = json.dumps(value)
+        setattr(state, field, value)
+        self.values[w.id] = state
+        return w
+
+    async def type(self, label, value):
+        w = self.set_value(label, value)
+        return await self.rerun(fragment_id=w.fragment_id)
+
+    async def click(self, label):
+        w = self.widgets[label]
+        return await self.rerun(trigger=WidgetState(id=w.id, trigger_value=True),
+                                fragment_id=w.fragment_id)
+
+    async def poll(self):
+        """Fire any run_every fragment timers that are due (the browser does this)."""
+        results = []
+        now = time.monotonic()
+        for fragment_id, (interval, due) in list(self.auto_reruns.items()):
+            if now >= due:
+                self.auto_reruns[fragment_id] = (interval, now + interval)
+                results.append(await self.rerun(fragment_id=fragment_id))
+        return results
+
+    async def rerun(self, trigger=None, fragment_id=""):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.fragment_id = fragment_id or ""
+        states = list(self.values.values()) + ([trigger] if trigger is not None else [])
+        msg.rerun_script.widget_states.widgets.extend(states)
+
+        started = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        full, deltas, nbytes = True, 0, 0
+        while True:
+            raw = await self.ws.recv()
+            nbytes += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof('type')
+            if kind == 'new_session':
+                full = not fwd.new_session.fragment_ids_this_run
+                if full:
+                    self.widgets, self.texts, self.auto_reruns = {}, [], {}
+            elif kind == 'delta':
+                deltas += 1
+                self._record_delta(fwd.delta)
+            elif kind == 'auto_rerun':
+                fid = fwd.auto_rerun.fragment_id
+                self.auto_reruns[fid] = (fwd.auto_rerun.interval,
+                                         time.monotonic() + fwd.auto_rerun.interval)
+            elif kind == 'script_finished':
+                # Streamlit reports a rerun requested from inside the script
+                # (st.rerun) as a premature stop and immediately starts again.
+                if fwd.script_finished == _FINISHED_EARLY_FOR_RERUN:
+                    continue
+                return RunResult(time.perf_counter() - started, full, deltas, nbytes)
+
+    def _record_delta(self, delta):
+        if delta.WhichOneof('type') != 'new_element':
+            return
+        el = delta.new_element
+        kind = el.WhichOneof('type')
+        if kind in ('heading', 'markdown', 'alert'):
+            body = getattr(el, kind).body
+            self.texts.append(body)
+            return
+        inner = getattr(el, kind)
+        wid = getattr(inner, 'id', None)
+        if not wid:
+            return
+        label = getattr(inner, 'label', '') or getattr(inner, 'component_name', '')
+        options = list(getattr(inner, 'options', []) or [])
+        widget = Widget(wid, kind, label, delta.fragment_id, options)
+        self.widgets[label] = widget
+        # Element ids look like "$$ID-<hash>-<user key or None>"
+        user_key = wid.split('-', 2)[-1]
+        if user_key != 'None':
+            self.widgets[user_key] = widget
+
+
+def run(coro):
+    return asyncio.run(coro)
@@ -0,0 +1,78 @@
+import os
+import statistics
+import time
+
+from state_store import cohort_position, get_store
+
+# ==========================================
+# COHORT REGISTRY
+# ==========================================
+# Where every student is, for the proctor. Sessions report their own moves
+# (login, WAIT -> RUNNING, Next/timeout, submit); the store keeps one record
+# per student. With the in-memory store a report replaces one record and
+# moves one count between positions, O(1) under a short lock; with the
+# shared SQLite store it is one upsert. Liveness pings from the timer
+# fragments are throttled to one write per COHORT_TOUCH_SECONDS. Nothing
+# here ever reads another session's state; the dashboard copies the
+# registry when it renders.
+
+COHORT_STALE_SECONDS = float(os.getenv("COHORT_STALE_SECONDS", "30"))
+COHORT_TOUCH_SECONDS = float(os.getenv("COHORT_TOUCH_SECONDS", "5"))
+STRAGGLER_PHASES = int(os.getenv("STRAGGLER_PHASES", "2"))
+
+position = cohort_position
+
+_touched = {}  # name -> last liveness ping written from this process
+
+
+def progress(rec):
+    # 0 = waiting, 1..15 = scenario/phase, 16 = finished
+    if rec.phase == 'RUNNING':
+        return (rec.scenario - 1) * 3 + rec.exam_phase
+    return {'FINISH': 16}.get(rec.phase, 0)
+
+
+def update(name, phase, scenario, exam_phase, locked):
+    get_store().report(name, phase, scenario, exam_phase, locked)
+    _touched[name] = time.time()
+
+
+def mark_submitted(name, outbox_id):
+    get_store().mark_submitted(name, outbox_id)
+
+
+def touch(name):
+    now = time.time()
+    if now - _touched.get(name, 0) >= COHORT_TOUCH_SECONDS:
+        _touched[name] = now
+        get_store().touch(name, now)
+
+
+def snapshot():
+    """(records, last_seen, counts per position) copies, for the proctor dashboard."""
+    return get_store().cohort()
+
+
+def stragglers(records, seen, now=None):
+    """Students who stopped reporting, or are well behind the middle of the room.
+
+    Returns [(record, reason)].
+    """
+    now = now or time.time()
+    moving = [progress(r) for r in records if r.phase in ('RUNNING', 'FINISH')]
+    middle = statistics.median(moving) if moving else 0
+    out = []
+    for rec in records:
+        if rec.phase not in ('WAIT', 'RUNNING'):
+            continue
+        idle = now - seen.get(rec.name, rec.updated_at)
+        if idle > COHORT_STALE_SECONDS:
+            out.append((rec, f"ไม่ตอบสนอง {idle:.0f} วินาที"))
+        elif rec.phase == 'RUNNING' and middle - progress(rec) >= STRAGGLER_PHASES:
+            out.append((rec, f"ช้ากว่ากลุ่ม {middle - progress(rec):.0f} ช่วง"))
+    return out
+
+
+def reset():
+    get_store().reset_cohort()
+    _touched.clear()
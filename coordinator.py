@@ -0,0 +1,45 @@
+import time
+
+from state_store import get_store
+
+# ==========================================
+# EXAM COORDINATOR
+# ==========================================
+# One shared, versioned exam state for every session. Writers replace it
+# atomically in the store (state_store.py); with the in-memory store readers
+# just take the current reference, so polling from hundreds of sessions costs
+# nothing, and with the SQLite store every worker process sees the same exam.
+
+
+def snapshot():
+    return get_store().exam()
+
+
+def start_exam(scenario=1, phase=1):
+    return get_store().start_exam(scenario, phase)
+
+
+def reset_exam():
+    return get_store().reset_exam()
+
+
+# ==========================================
+# PHASE TIMER
+# ==========================================
+# All deadlines are computed on the server clock. A phase's anchor is the exam
+# start for the opening phase, the previous deadline after a timeout, or the
+# moment the student pressed Next; rerun latency never shifts the schedule.
+
+def now():
+    return time.time()
+
+
+def phase_anchor(scenario, phase):
+    exam = snapshot()
+    if exam.started_at is not None and (scenario, phase) == (exam.scenario, exam.phase):
+        return exam.started_at
+    return now()
+
+
+def remaining(anchor, duration):
+    return anchor + duration - now()
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import io
+import os
+import time
+
+import journal
+from flowchart import FLOWCHARTS, ORDER_SEPARATOR, answer_order
+
+# ==========================================
+# COHORT EXPORT (streaming)
+# ==========================================
+# One file for the whole room, built from the journal on demand: every
+# student's answers with the flowcharts flattened to "block → block → ...",
+# plus the deterministic grades (answer_key.py, flowchart.py). Students are
+# read and scored EXPORT_CHUNK at a time and each chunk is written before the
+# next is read, so memory stays bounded by the chunk size, not the cohort.
+#
+#   python export.py --format parquet --out cohort.parquet
+#   python export.py --format csv --out cohort.csv --journal /srv/exam/journal.sqlite3
+#   python export.py --out cohort.parquet --similar similar.csv   # + near-duplicate essays
+
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "500"))
+
+FLOWCHART_METRICS = ('score', 'lcs', 'kendall_tau')
+
+
+def flatten(answers, fields):
+    """One flat row of strings: flowcharts become their ordered answer blocks."""
+    row = {}
+    for field in fields:
+        value = answers.get(field)
+        if field.endswith('_flowchart'):
+            row[field] = ORDER_SEPARATOR.join(answer_order(value))
+        else:
+            row[field] = '' if value is None else str(value)
+    return row
+
+
+def grade_columns():
+    from answer_key import ANSWER_KEY
+    cols = [f'{field}_score' for field in ANSWER_KEY]
+    cols += [f's{sc}_flowchart_{m}' for sc in sorted(FLOWCHARTS) for m in FLOWCHART_METRICS]
+    return cols + ['total_score']
+
+
+def columns(fields):
+    return ['student'] + [f for f in fields if f != 'student'] + grade_columns()
+
+
+def _grade(answers_list):
+    from answer_key import score_cohort
+    from flowchart import score_flowcharts
+
+    scores, _, _ = score_cohort(answers_list)
+    charts = score_flowcharts(answers_list)
+    grades = scores.add_suffix('_score')
+    for sc in sorted(FLOWCHARTS):
+        for m in FLOWCHART_METRICS:
+            grades[f's{sc}_flowchart_{m}'] = charts[f's{sc}_flowchart_{m}'].astype(float)
+    chart_scores = [f's{sc}_flowchart_score' for sc in sorted(FLOWCHARTS)]
+    grades['total_score'] = scores.sum(axis=1) + grades[chart_scores].sum(axis=1)
+    return grades
+
+
+def iter_chunks(source, fields, chunk=EXPORT_CHUNK):
+    """DataFrames of `columns(fields)`, `chunk` students each."""
+    import pandas as pd
+
+    cols = columns(fields)
+    batch = []
+
+    def build():
+        raw = [answers for _, answers in batch]
+        df = pd.DataFrame([{'student': name, **flatten(answers, fields)} for name, answers in batch])
+        df = pd.concat([df, _grade(raw)], axis=1)
+        return df.reindex(columns=cols)
+
+    for student, answers, _ in source:
+        batch.append((student, answers))
+        if len(batch) >= chunk:
+            yield build()
+            batch = []
+    if batch:
+        yield build()
+
+
+def write_csv(out, chunks):
+    rows = 0
+    for i, df in enumerate(chunks):
+        df.to_csv(out, index=False, header=(i == 0))
+        rows += len(df)
+    return rows
+
+
+def write_parquet(out, chunks, fields):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    grade_cols = set(grade_columns())
+    schema = pa.schema([(c, pa.float64() if c in grade_cols else pa.string()) for c in columns(fields)])
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for df in chunks:
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+    return rows
+
+
+def export_cohort(out, fmt='csv', jrnl=None, fields=None, chunk=EXPORT_CHUNK, similar=None):
+    """Stream every journaled student into `out` (a path or binary file).
+
+    With `similar` (a path), essays are indexed while they stream past and
+    the near-duplicate pairs (similarity.py) are written there afterwards.
+    Returns {'students': n, 'seconds': t} (+ 'similar_pairs').
+    """
+    started = time.perf_counter()
+    jrnl = jrnl or journal.get_journal()
+    fields = list(fields or jrnl.answer_fields())
+    source = jrnl.iter_students()
+    indexes = None
+    if similar is not None:
+        import similarity
+        indexes = {f: similarity.SimilarityIndex() for f in similarity.ESSAY_FIELDS if f in fields}
+        source = similarity.tee(source, indexes)
+    chunks = iter_chunks(source, fields, chunk)
+    if fmt == 'parquet':
+        rows = write_parquet(out, chunks, fields)
+    elif fmt == 'csv':
+        if isinstance(out, (str, os.PathLike)):
+            with open(out, 'w', newline='', encoding='utf-8') as f:
+                rows = write_csv(f, chunks)
+        else:
+            text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+            rows = write_csv(text, chunks)
+            text.detach()
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+    result = {'students': rows, 'seconds': time.perf_counter() - started}
+    if indexes is not None:
+        with open(similar, 'w', newline='', encoding='utf-8') as f:
+            result['similar_pairs'] = similarity.write_pairs(f, indexes)
+        result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def export_bytes(fmt='csv', fields=None):
+    """The whole cohort export as bytes, for a download button."""
+    buf = io.BytesIO()
+    export_cohort(buf, fmt, fields=fields)
+    return buf.getvalue()
+
+
+def student_csv(answers, fields):
+    """One student's answers as a small CSV (header + one row), no pandas."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=list(fields))
+    writer.writeheader()
+    writer.writerow(flatten(answers, fields))
+    return buf.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every student's answers and grades")
+    parser.add_argument("--format", choices=['csv', 'parquet'], default='parquet')
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--journal", default=journal.JOURNAL_PATH)
+    parser.add_argument("--chunk", type=int, default=EXPORT_CHUNK)
+    parser.add_argument("--similar", default=None, help="also write near-duplicate essay pairs (CSV) here")
+    args = parser.parse_args()
+
+    result = export_cohort(args.out, args.format, journal.Journal(args.journal), chunk=args.chunk,
+                           similar=args.similar)
+    print(f"{result['students']} students -> {args.out} in {result['seconds']:.2f}s")
+    if args.similar:
+        print(f"{result['similar_pairs']} similar essay pairs -> {args.similar}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import ast
+import json
+import math
+
+# ==========================================
+# FLOWCHART (sort_items) BLOCKS & SCORING
+# ==========================================
+# Phase 2 of every scenario asks the student to drag blocks into the
+# "คำตอบของคุณ" container in causal order. The options shown are
+# correct + distractors, in that order. The app only needs the block lists;
+# numpy/pandas are imported by the scoring functions when they run.
+
+OPTIONS_HEADER = 'ตัวเลือก'
+ANSWER_HEADER = 'คำตอบของคุณ'
+ORDER_SEPARATOR = ' → '  # flattened answer order in cohort exports
+
+FLOWCHARTS = {
+    1: {
+        'correct': [
+            'Toxin absorption through skin/inhalation',
+            'Inhibition of Acetylcholinesterase',
+            'Acetylcholine accumulation in Synaptic Cleft',
+            'Continuous stimulation of Muscarinic & Nicotinic Receptors',
+        ],
+        'distractors': [
+            'Blockage of Acetylcholine Receptors',
+            'Decreased production of Acetylcholine',
+            'Irreversible activation of Acetylcholinesterase',
+            'Massive release of Norepinephrine from Nerve endings',
+            'Inhibition of Voltage-gated Calcium Channels',
+            'Hyperpolarization of the Post-synaptic membrane',
+        ],
+    },
+    2: {
+        'correct': [
+            'Absence of Insulin activity',
+            'Cells cannot uptake Glucose',
+            'Lipolysis / Fatty Acid Breakdown',
+            'Liver produces Ketone Bodies',
+            'Accumulation of Acid in Blood',
+        ],
+        'distractors': [
+            'Increased Protein Synthesis',
+            'Lactate fermentation (Anaerobic)',
+            'Kidney retains Bicarbonate',
+        ],
+    },
+    3: {
+        'correct': [
+            'Genetic Mutation/Deletion',
+            'Defective Globin chain synthesis',
+            'Precipitation of excess Globin chains',
+            'RBC Membrane damage & Hemolysis',
+            'Chronic Hypoxia (Lack of oxygen)',
+            'Extramedullary Hematopoiesis (Liver/Spleen enlargement)',
+        ],
+        'distractors': [
+            'Iron Deficiency from poor diet',
+            'Autoimmune destroys RBC',
+            'Polymerization of Hemoglobin S',
+            'Defective Heme synthesis',
+            'Bone marrow aplasia',
+            'Deficiency of G6PD enzyme',
+        ],
+    },
+    4: {
+        'correct': [
+            'Activation of Sympathetic Nervous System (Baroreceptor reflex)',
+            'Adrenal Medulla releases Adrenaline',
+            'Kidney secretes Renin & Angiotensin II formation',
+            'General Vasoconstriction & Increased Heart Rate',
+            'Adrenal Cortex secretes Aldosterone',
+            'Increased Na+ & Water Reabsorption at Kidney',
+        ],
+        'distractors': [
+            'Increased Secretion of Atrial Natriuretic Peptide',
+            'Stimulation of Vagus Nerve (Parasympathetic)',
+            'Dilation of Peripheral Blood Vessels',
+            'Inhibition of ADH (Vasopressin) release',
+            'Increased Potassium Reabsorption',
+            'Increased Urine Output',
+        ],
+    },
+    5: {
+        'correct': [
+            'Rabies Virus enters the wound',
+            'Rabies Immunoglobulin binds and neutralizes virus at the wound site',
+            'Rabies vaccine stimulates Antigen Presenting Cells',
+            'Activation of Helper T-Cells & B-Cells',
+            'Production of specific Antibodies',
+            'Long-term protection against virus',
+        ],
+        'distractors': [
+            'Tetanus Vaccine destroys virus immediately',
+            'Rabies Immunoglobulin creates Memory Cells',
+            'Tetanus Toxoid kills Rabies virus',
+            'Tetanus antitoxin activates Helper T-Cells & B-Cells',
+        ],
+    },
+}
+
+# Final score = LCS_WEIGHT * lcs/k + TAU_WEIGHT * agreement - penalty, clipped to [0, 1]
+LCS_WEIGHT = 0.7
+TAU_WEIGHT = 0.3
+DISTRACTOR_PENALTY = 0.1  # per distractor block placed in the answer
+
+
+def flowchart_blocks(sc):
+    chart = FLOWCHARTS[sc]
+    return chart['correct'] + chart['distractors']
+
+
+def flowchart_items(sc):
+    return [{'header': OPTIONS_HEADER, 'items': flowchart_blocks(sc)}, {'header': ANSWER_HEADER, 'items': []}]
+
+
+def answer_order(raw):
+    """The student's ordered block list from a stored sort_items value.
+
+    Accepts the live list of containers, a single flat list, the
+    stringified form found in per-student CSVs, or the "a → b → c" order
+    written by cohort exports.
+    """
+    if raw is None or (isinstance(raw, float) and math.isnan(raw)):
+        return []
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if not raw:
+            return []
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            try:
+                raw = ast.literal_eval(raw)
+            except (ValueError, SyntaxError):
+                return [item.strip() for item in raw.split(ORDER_SEPARATOR.strip()) if item.strip()]
+    if not isinstance(raw, (list, tuple)):
+        return []
+    if raw and all(isinstance(c, dict) for c in raw):
+        for container in raw:
+            if container.get('header') == ANSWER_HEADER:
+                return list(container.get('items', []))
+        return list(raw[-1].get('items', []))
+    return [item for item in raw if isinstance(item, str)]
+
+
+def encode_orders(sc, answers):
+    """(N, L) int matrix of block ids per student, padded with -1.
+
+    Ids 0..k-1 are the correct blocks in canonical order, k.. the distractors;
+    unknown strings are dropped.
+    """
+    import numpy as np
+    blocks = flowchart_blocks(sc)
+    index = {b: i for i, b in enumerate(blocks)}
+    width = len(blocks)
+    out = np.full((len(answers), width), -1, dtype=np.int16)
+    for row, raw in enumerate(answers):
+        ids = [index[b] for b in answer_order(raw) if b in index][:width]
+        out[row, :len(ids)] = ids
+    return out
+
+
+def score_orders(ids, k):
+    """Vectorized ordering metrics for an (N, L) id matrix; k = # correct blocks."""
+    import numpy as np
+    valid = ids >= 0
+    is_correct = valid & (ids < k)
+    n, width = ids.shape
+
+    # LCS with the canonical sequence 0..k-1 is the longest increasing run of
+    # correct ids (every id appears at most once), computed for all rows at once
+    lis = np.zeros((n, width), dtype=np.int16)
+    for i in range(width):
+        best = np.zeros(n, dtype=np.int16)
+        for j in range(i):
+            ok = is_correct[:, j] & (ids[:, j] < ids[:, i])
+            best = np.where(ok & (lis[:, j] > best), lis[:, j], best)
+        lis[:, i] = np.where(is_correct[:, i], best + 1, 0)
+    lcs = lis.max(axis=1) if width else np.zeros(n, dtype=np.int16)
+
+    # Kendall tau over the pairs of correct blocks the student placed
+    a = ids[:, :, None]
+    b = ids[:, None, :]
+    both = is_correct[:, :, None] & is_correct[:, None, :]
+    later = np.triu(np.ones((width, width), dtype=bool), 1)[None, :, :]
+    pairs = both & later
+    concordant = (pairs & (a < b)).sum(axis=(1, 2))
+    discordant = (pairs & (a > b)).sum(axis=(1, 2))
+    total = concordant + discordant
+    tau = np.divide(concordant - discordant, total, out=np.zeros(n), where=total > 0)
+
+    placed = is_correct.sum(axis=1)
+    distractors = (valid & (ids >= k)).sum(axis=1)
+    agreement = np.where(total > 0, (tau + 1) / 2, (placed > 0).astype(float)) * placed / k
+    score = np.clip(LCS_WEIGHT * lcs / k + TAU_WEIGHT * agreement - DISTRACTOR_PENALTY * distractors, 0, 1)
+    return {
+        'placed': placed,
+        'distractors': distractors,
+        'lcs': lcs,
+        'kendall_tau': tau,
+        'score': score,
+    }
+
+
+def score_flowcharts(rows, scenarios=None):
+    """Score every student's s{n}_flowchart for each scenario.
+
+    rows: iterable of answer dicts or a DataFrame. Returns a DataFrame with
+    one column per (scenario, metric), e.g. s3_flowchart_score.
+    """
+    import pandas as pd
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    out = pd.DataFrame(index=df.index)
+    for sc in scenarios or sorted(FLOWCHARTS):
+        field = f's{sc}_flowchart'
+        answers = df[field].tolist() if field in df else [None] * len(df)
+        metrics = score_orders(encode_orders(sc, answers), len(FLOWCHARTS[sc]['correct']))
+        for name, values in metrics.items():
+            out[f'{field}_{name}'] = values
+    return out
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# ==========================================
+# PERSISTENT AI GRADE CACHE
+# ==========================================
+# Content-addressed: the key is a hash of (normalized answer, question,
+# rubric, model). Regrading an unchanged cohort never reaches the API, and a
+# rubric tweak only misses for the questions it touched. Least recently used
+# rows are evicted once the table grows past max_entries.
+
+GRADE_CACHE_PATH = os.getenv("GRADE_CACHE_PATH", "grade_cache.sqlite3")
+GRADE_CACHE_MAX_ENTRIES = int(os.getenv("GRADE_CACHE_MAX_ENTRIES", "100000"))
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_answer(text):
+    text = unicodedata.normalize("NFC", str(text or ""))
+    return _SPACE.sub(" ", text).strip().casefold()
+
+
+def model_name_of(model):
+    return getattr(model, 'model_name', None) or type(model).__name__
+
+
+def cache_key(question, student_ans, rubric, model_name):
+    raw = json.dumps([normalize_answer(student_ans), question, rubric, model_name], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class GradeCache:
+
+    def __init__(self, path=GRADE_CACHE_PATH, max_entries=GRADE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, model TEXT,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS grades_last_used ON grades(last_used)")
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM grades WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE grades SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, result, model_name=None):
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO grades (key, result, model, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, result, model_name, now, now),
+            )
+            self.entries += cur.rowcount
+            if self.entries > self.max_entries:
+                self._evict(self.entries - self.max_entries)
+
+    def _evict(self, count):
+        cur = self.conn.execute(
+            "DELETE FROM grades WHERE key IN (SELECT key FROM grades ORDER BY last_used LIMIT ?)", (count,)
+        )
+        self.entries -= cur.rowcount
+        self.evictions += cur.rowcount
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM grades")
+            self.entries = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': self.entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def cached_grade(cache, model, question, student_ans, rubric, grade_fn):
+    """Return a cached grade, or call grade_fn() and remember its result.
+
+    Only successful results are stored; exceptions propagate uncached.
+    """
+    if cache is None:
+        return grade_fn()
+    name = model_name_of(model)
+    key = cache_key(question, student_ans, rubric, name)
+    result = cache.get(key)
+    if result is None:
+        result = grade_fn()
+        cache.put(key, result, name)
+    return result
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GradeCache()
+        return _cache
@@ -0,0 +1,230 @@
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import grade_cache
+
+# ==========================================
+# AI GRADING PIPELINE
+# ==========================================
+# A worker pool around the Gemini call, used by the regrade CLI (regrade.py).
+# Jobs are submitted without blocking the caller, which polls status(job_id)
+# and collect()s each job once it has finished. Finished jobs nobody collects
+# are dropped, oldest first, past GRADING_KEEP_FINISHED.
+
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY", "4"))
+GRADING_RATE_PER_SEC = float(os.getenv("GRADING_RATE_PER_SEC", "1"))
+GRADING_BURST = int(os.getenv("GRADING_BURST", "4"))
+GRADING_MAX_RETRIES = int(os.getenv("GRADING_MAX_RETRIES", "5"))
+GRADING_KEEP_FINISHED = int(os.getenv("GRADING_KEEP_FINISHED", "1000"))
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+
+NO_MODEL_RESULT = "Error: No API Key (Mock Score: 0/10)"
+
+PROMPT_TEMPLATE = """
+Role: Biology Examiner.
+Task: Grade this student answer strictly based on keywords.
+Question: {question}
+Student Answer: {student_ans}
+Rubric Keywords: {rubric}
+Output format: Give ONLY the score (0-10) and a short 1-sentence feedback.
+Example: Score: 8/10. Correctly identified receptor but missed competitive inhibition.
+"""
+
+# Errors that mean "slow down and try again" rather than "this answer failed"
+RETRYABLE_ERRORS = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded'}
+
+
+def build_prompt(question, student_ans, rubric):
+    return PROMPT_TEMPLATE.format(question=question, student_ans=student_ans, rubric=rubric)
+
+
+def grade_answer(model, question, student_ans, rubric):
+    response = model.generate_content(build_prompt(question, student_ans, rubric))
+    return response.text
+
+
+def is_retryable(exc):
+    if type(exc).__name__ in RETRYABLE_ERRORS:
+        return True
+    text = str(exc).lower()
+    return '429' in text or 'quota' in text or 'rate limit' in text
+
+
+class TokenBucket:
+    """Allow `rate` calls per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GradingPool:
+
+    def __init__(self, model, max_workers=GRADING_CONCURRENCY, rate_per_sec=GRADING_RATE_PER_SEC,
+                 burst=GRADING_BURST, max_retries=GRADING_MAX_RETRIES, backoff_base=1.0, backoff_max=30.0,
+                 cache=None, keep_finished=GRADING_KEEP_FINISHED):
+        self.model = model
+        self.cache = cache
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="grader")
+        self.jobs = {}
+        self.finished = deque()  # ids in finishing order, for eviction
+        self.keep_finished = keep_finished
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, question, student_ans, rubric, tag=None):
+        job_id = next(self.ids)
+        job = {
+            'id': job_id, 'tag': tag, 'status': 'queued', 'attempts': 0, 'cached': False,
+            'result': None, 'error': None, 'submitted_at': time.time(), 'finished_at': None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        job['future'] = self.executor.submit(self._run, job, question, student_ans, rubric)
+        return job_id
+
+    def _run(self, job, question, student_ans, rubric):
+        job['status'] = 'running'
+        if self.model is None:
+            return self._finish(job, 'done', NO_MODEL_RESULT)
+        try:
+            result = grade_cache.cached_grade(
+                self.cache, self.model, question, student_ans, rubric,
+                lambda: self._call_model(job, question, student_ans, rubric),
+            )
+        except Exception as e:
+            job['error'] = str(e)
+            return self._finish(job, 'failed', f"AI Error: {e}")
+        job['cached'] = job['attempts'] == 0
+        return self._finish(job, 'done', result)
+
+    def _call_model(self, job, question, student_ans, rubric):
+        while True:
+            self.bucket.acquire()
+            job['attempts'] += 1
+            try:
+                return grade_answer(self.model, question, student_ans, rubric)
+            except Exception as e:
+                if not is_retryable(e) or job['attempts'] > self.max_retries:
+                    raise
+                job['status'] = 'retrying'
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (job['attempts'] - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _finish(self, job, status, result):
+        job['result'] = result
+        job['finished_at'] = time.time()
+        job['status'] = status
+        with self.lock:
+            self.finished.append(job['id'])
+            while len(self.finished) > self.keep_finished:
+                self.jobs.pop(self.finished.popleft(), None)
+        return result
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != 'future'}
+
+    def collect(self, job_id):
+        """status() of a finished job, removed from the pool; None while it runs."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] not in ('done', 'failed'):
+                return None
+            del self.jobs[job_id]
+        return {k: v for k, v in job.items() if k != 'future'}
+
+    def result(self, job_id, timeout=None):
+        return self.jobs[job_id]['future'].result(timeout)
+
+    def progress(self):
+        counts = {'queued': 0, 'running': 0, 'retrying': 0, 'done': 0, 'failed': 0}
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            counts[job['status']] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model(api_key):
+    """The process-wide Gemini model, or None without an API key.
+
+    google.generativeai is imported here, on first use, so rendering the exam
+    never pays for it.
+    """
+    global _model
+    if not api_key:
+        return None
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(GEMINI_MODEL)
+        return _model
+
+
+# ==========================================
+# FAKE MODEL (offline benchmarks)
+# ==========================================
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel: sleeps like a network call and
+    fails with a quota error on every `quota_every`-th request."""
+
+    def __init__(self, latency=0.5, jitter=0.2, quota_every=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_every = quota_every
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if self.quota_every and call % self.quota_every == 0:
+            raise QuotaExceeded("429 Resource has been exhausted (e.g. check quota).")
+        score = len(prompt) % 11
+        return FakeResponse(f"Score: {score}/10. Offline fake grade.")
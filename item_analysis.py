@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flowchart import FLOWCHARTS, answer_order
+
+# ==========================================
+# ITEM ANALYSIS (incremental)
+# ==========================================
+# Classical test statistics for every keyed question (answer_key.py) and
+# every flowchart, kept as running sums so a submission is folded in with a
+# few vector additions and nothing is ever recomputed over the cohort:
+#   n, sum s_j, sum s_j^2, sum s_j*X, sum X, sum X^2   (X = total score)
+# From those, at any time:
+#   difficulty      p_j = mean item score
+#   discrimination  corrected item-total correlation (item vs. the rest)
+#   reliability     Cronbach's alpha (KR-20 for the 0/1 items)
+# plus, per radio/select option and per wrong flowchart block, how many
+# students picked it and their mean total score (a distractor that attracts
+# strong students is a flawed distractor).
+#
+# Each student is counted once, when they first send their answers. The
+# sums live in the state store, so several workers/rooms share one set and
+# the proctor dashboard reads O(items), however large the cohort.
+
+ITEM_ANALYSIS_CHUNK = int(os.getenv("ITEM_ANALYSIS_CHUNK", "500"))
+
+log = logging.getLogger(__name__)
+
+
+def items():
+    from answer_key import ANSWER_KEY
+    return list(ANSWER_KEY) + [f's{sc}_flowchart' for sc in sorted(FLOWCHARTS)]
+
+
+def choice_items():
+    from answer_key import ANSWER_KEY
+    return [f for f, spec in ANSWER_KEY.items() if spec['kind'] == 'choice']
+
+
+def score_matrix(records):
+    """(scores, picks) for a list of answer dicts.
+
+    scores is an n x len(items()) array; picks maps each choice item and each
+    flowchart to a list with, per student, the options they chose.
+    """
+    import numpy as np
+    from answer_key import answer_frame, score_cohort
+    from flowchart import score_flowcharts
+
+    keyed, _, _ = score_cohort(records)
+    charts = score_flowcharts(records)
+    chart_cols = [f's{sc}_flowchart_score' for sc in sorted(FLOWCHARTS)]
+    scores = np.column_stack([keyed.to_numpy(dtype=float), charts[chart_cols].to_numpy(dtype=float)])
+
+    df = answer_frame(records)
+    picks = {}
+    for field in choice_items():
+        col = df[field].fillna('').astype(str).str.strip() if field in df else [''] * len(df)
+        picks[field] = [[v] if v else [] for v in col]
+    for sc in sorted(FLOWCHARTS):
+        field = f's{sc}_flowchart'
+        wrong = set(FLOWCHARTS[sc]['distractors'])
+        picks[field] = [[b for b in answer_order(r.get(field)) if b in wrong] for r in records]
+    return scores, picks
+
+
+class ItemStats:
+
+    def __init__(self, names=None):
+        import numpy as np
+
+        self.items = list(names or items())
+        k = len(self.items)
+        self.n = 0
+        self.s = np.zeros(k)    # sum of item scores
+        self.ss = np.zeros(k)   # sum of squared item scores
+        self.sx = np.zeros(k)   # sum of item score * total
+        self.x = 0.0            # sum of totals
+        self.xx = 0.0           # sum of squared totals
+        self.options = {}       # item -> {option: [times picked, sum of pickers' totals]}
+
+    def add(self, scores, picks):
+        import numpy as np
+        import pandas as pd
+
+        scores = np.asarray(scores, dtype=float).reshape(-1, len(self.items))
+        totals = scores.sum(axis=1)
+        self.n += len(scores)
+        self.s += scores.sum(axis=0)
+        self.ss += (scores * scores).sum(axis=0)
+        self.sx += scores.T @ totals
+        self.x += float(totals.sum())
+        self.xx += float(totals @ totals)
+        for item, chosen in picks.items():
+            rows = np.repeat(np.arange(len(chosen)), [len(c) for c in chosen])
+            if not len(rows):
+                continue
+            codes, uniques = pd.factorize(pd.Series([o for c in chosen for o in c]))
+            counts = np.bincount(codes, minlength=len(uniques))
+            sums = np.bincount(codes, weights=totals[rows], minlength=len(uniques))
+            opts = self.options.setdefault(item, {})
+            for option, count, total in zip(uniques, counts, sums):
+                cur = opts.setdefault(option, [0, 0.0])
+                cur[0] += int(count)
+                cur[1] += float(total)
+        return self
+
+    def merge(self, other):
+        s, ss, sx = other.s, other.ss, other.sx
+        if other.items != self.items:
+            # Same items listed in another order (e.g. saved before the key moved)
+            if sorted(other.items) != sorted(self.items):
+                raise ValueError("ItemStats cover different items; rebuild them from the journal")
+            order = [other.items.index(item) for item in self.items]
+            s, ss, sx = s[order], ss[order], sx[order]
+        self.n += other.n
+        self.s += s
+        self.ss += ss
+        self.sx += sx
+        self.x += other.x
+        self.xx += other.xx
+        for item, opts in other.options.items():
+            mine = self.options.setdefault(item, {})
+            for option, (count, total) in opts.items():
+                cur = mine.setdefault(option, [0, 0.0])
+                cur[0] += count
+                cur[1] += total
+        return self
+
+    def to_json(self):
+        return json.dumps({
+            'items': self.items, 'n': self.n, 's': self.s.tolist(), 'ss': self.ss.tolist(),
+            'sx': self.sx.tolist(), 'x': self.x, 'xx': self.xx, 'options': self.options,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        import numpy as np
+
+        data = json.loads(text)
+        stats = cls(data['items'])
+        stats.n, stats.x, stats.xx = data['n'], data['x'], data['xx']
+        stats.s, stats.ss, stats.sx = (np.array(data[k], dtype=float) for k in ('s', 'ss', 'sx'))
+        stats.options = data['options']
+        return stats
+
+    # -- statistics ------------------------------------------------------
+    def _moments(self):
+        import numpy as np
+
+        n = max(self.n, 1)
+        mean = self.s / n
+        var = np.maximum(self.ss / n - mean ** 2, 0.0)
+        total_mean = self.x / n
+        total_var = max(self.xx / n - total_mean ** 2, 0.0)
+        cov = self.sx / n - mean * total_mean
+        return mean, var, total_var, cov
+
+    def table(self):
+        """One dict per item: n, difficulty, sd, discrimination (None until defined)."""
+        import numpy as np
+
+        mean, var, total_var, cov = self._moments()
+        # Item against the rest of the test, so an item is not correlated with itself
+        rest_var = total_var - 2 * cov + var
+        denom = np.sqrt(var * np.maximum(rest_var, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            disc = np.where(denom > 0, (cov - var) / denom, np.nan)
+        return [
+            {'item': item, 'n': self.n, 'difficulty': float(mean[j]) if self.n else None,
+             'sd': float(np.sqrt(var[j])) if self.n else None,
+             'discrimination': None if np.isnan(disc[j]) else float(disc[j])}
+            for j, item in enumerate(self.items)
+        ]
+
+    def alpha(self):
+        """Cronbach's alpha over all items, or None with fewer than two students."""
+        _, var, total_var, _ = self._moments()
+        k = len(self.items)
+        if self.n < 2 or k < 2 or total_var <= 0:
+            return None
+        return k / (k - 1) * (1 - float(var.sum()) / total_var)
+
+    def distractors(self, item):
+        """[(option, picked, share of students, mean total of pickers)], most picked first."""
+        opts = self.options.get(item, {})
+        rows = [(option, count, count / self.n if self.n else 0.0, total / count if count else 0.0)
+                for option, (count, total) in opts.items()]
+        return sorted(rows, key=lambda r: -r[1])
+
+
+def record_submission(name, answers):
+    """Fold one student's final answers into the shared statistics (once per student)."""
+    from state_store import get_store
+
+    stats = ItemStats().add(*score_matrix([answers]))
+    return get_store().add_item_stats(name, stats)
+
+
+# Scoring one submission takes tens of milliseconds (hundreds on the first
+# call), so the send button only queues it; one thread folds them in turn.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _record(name, answers):
+    import metrics
+    try:
+        with metrics.timed('item_analysis_seconds'):
+            record_submission(name, answers)
+    except Exception:
+        log.exception("item analysis failed for %s", name)
+
+
+def record_later(name, answers):
+    """Queue record_submission off the caller's thread; returns at once."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="item-analysis")
+    return _executor.submit(_record, name, dict(answers))
+
+
+def snapshot():
+    from state_store import get_store
+    return get_store().item_stats() or ItemStats()
+
+
+def rebuild(jrnl, students):
+    """Recompute from the journal for `students` (e.g. everyone with a submission).
+
+    Reads and scores ITEM_ANALYSIS_CHUNK students at a time and replaces the
+    shared statistics; for a store started after the exam, or a new key.
+    """
+    from state_store import get_store
+
+    wanted = set(students)
+    stats, batch, names = ItemStats(), [], []
+    for student, answers, _ in jrnl.iter_students():
+        if student not in wanted:
+            continue
+        batch.append(answers)
+        names.append(student)
+        if len(batch) >= ITEM_ANALYSIS_CHUNK:
+            stats.add(*score_matrix(batch))
+            batch = []
+    if batch:
+        stats.add(*score_matrix(batch))
+    get_store().replace_item_stats(names, stats)
+    return stats
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# ==========================================
+# ANSWER JOURNAL (crash-safe session resume)
+# ==========================================
+# Append-only log of what each student changed. Sessions queue small diff
+# records ("these answers changed", "now on scenario 3 phase 2"); one writer
+# thread commits everything queued in a single transaction every
+# JOURNAL_FLUSH_SECONDS, so hundreds of students typing cost one fsync per
+# batch instead of one per keystroke. Replaying a student's records in order
+# rebuilds their answers, locked phases and timer anchors.
+
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "journal.sqlite3")
+JOURNAL_FLUSH_SECONDS = float(os.getenv("JOURNAL_FLUSH_SECONDS", "0.5"))
+
+ANSWERS, STATE = 'answers', 'state'
+
+log = logging.getLogger(__name__)
+
+
+class Journal:
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=JOURNAL_FLUSH_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, student TEXT NOT NULL,"
+            " t REAL NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS journal_student ON journal(student, seq)")
+        self.pending = queue.Queue()
+        self.retry = []  # a batch whose commit failed, written first next time
+        self.records = 0
+        self.batches = 0
+        self.failures = 0
+        self.thread = threading.Thread(target=self._writer_loop, name="journal-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, student, kind, data):
+        self.pending.put((student, time.time(), kind, json.dumps(data, ensure_ascii=False)))
+
+    def flush(self):
+        """Commit everything queued so far (one transaction, one fsync)."""
+        # Drain under the lock so concurrent flushes can't commit out of order
+        with self.lock:
+            batch, self.retry = self.retry, []
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return 0
+            try:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("INSERT INTO journal (student, t, kind, data) VALUES (?, ?, ?, ?)", batch)
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                # e.g. another worker held the write lock past the timeout:
+                # leave no transaction open and keep the batch for the next flush
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                self.retry = batch
+                self.failures += 1
+                raise
+            self.records += len(batch)
+            self.batches += 1
+        return len(batch)
+
+    def _writer_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                # Keep the writer alive; the batch is retried on the next flush
+                log.warning("journal flush failed, %d records kept for retry: %s", len(self.retry), e)
+
+    def restore(self, student):
+        """Replay a student's records: {'answers': {...}, 'state': {...}}, or None."""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT kind, data FROM journal WHERE student = ? ORDER BY seq", (student,)
+            ).fetchall()
+        if not rows:
+            return None
+        answers, state = {}, {}
+        for kind, data in rows:
+            if kind == ANSWERS:
+                answers.update(json.loads(data))
+            elif kind == STATE:
+                state.update(json.loads(data))
+        return {'answers': answers, 'state': state}
+
+    def iter_students(self, batch=1000):
+        """(student, answers, state) for every student in name order, one at a time.
+
+        Reads through its own connection in batches, so memory stays at one
+        student's records however large the journal is.
+        """
+        self.flush()
+        conn = sqlite3.connect(self.path)
+        try:
+            cur = conn.execute("SELECT student, kind, data FROM journal ORDER BY student, seq")
+            current, answers, state = None, {}, {}
+            while True:
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                for student, kind, data in rows:
+                    if student != current:
+                        if current is not None:
+                            yield current, answers, state
+                        current, answers, state = student, {}, {}
+                    if kind == ANSWERS:
+                        answers.update(json.loads(data))
+                    elif kind == STATE:
+                        state.update(json.loads(data))
+            if current is not None:
+                yield current, answers, state
+        finally:
+            conn.close()
+
+    def answer_fields(self):
+        """Every answer field name ever journaled."""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT j.key FROM journal, json_each(journal.data) AS j WHERE journal.kind = ?", (ANSWERS,)
+            ).fetchall()
+        return sorted(r[0] for r in rows)
+
+    def stats(self):
+        return {'records': self.records, 'batches': self.batches, 'failures': self.failures,
+                'queued': self.pending.qsize() + len(self.retry)}
+
+
+def diff_answers(answers, seen):
+    """Fields whose value differs from what was last journaled."""
+    return {k: v for k, v in answers.items() if k not in seen or seen[k] != v}
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = Journal()
+        return _journal
@@ -0,0 +1,240 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# METRICS (process-wide, low overhead)
+# ==========================================
+# Histograms and counters keyed by (name, labels), shared by every session
+# in the process. Recording is a perf_counter pair, a bisect and a few
+# additions under one lock. Everything expensive (Streamlit's own memory
+# stats, formatting) happens only when someone asks for an export: the
+# proctor view in app.py, or the optional HTTP exporter on METRICS_PORT
+# (/metrics for Prometheus, /metrics.json).
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# A session that neither reran nor ticked for this long is no longer counted
+METRICS_SESSION_IDLE_SECONDS = float(os.getenv("METRICS_SESSION_IDLE_SECONDS", "60"))
+
+# seconds; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'section_seconds': "Time spent in one section of the exam script",
+    'submit_seconds': "Time to queue a form submission",
+    'grade_seconds': "Time for one AI grading call (cache hits included)",
+    'errors_total': "Exceptions raised inside an instrumented section",
+}
+
+_lock = threading.Lock()
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}     # (name, labels) -> value
+_session_bytes = {}  # student -> [latest session_state_bytes, last seen]
+_started = time.time()
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name, value, **labels):
+    key = (name, _labels(labels))
+    i = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        h[i] += 1
+        h[-1] += value
+
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def timed(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc('errors_total', metric=name, **labels)
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def bucket_quantile(buckets, q):
+    """Upper bound of the bucket holding quantile q (Prometheus-style estimate)."""
+    total = sum(buckets.values())
+    if not total:
+        return 0.0
+    seen = 0
+    for le, count in buckets.items():
+        seen += count
+        if seen >= q * total:
+            return float(le)
+    return float('inf')
+
+
+def record_session_bytes(student, nbytes):
+    with _lock:
+        _session_bytes[student] = [nbytes, time.time()]
+
+
+def touch_session(student):
+    # Timer/poll fragments keep a live session counted between full reruns
+    with _lock:
+        entry = _session_bytes.get(student)
+        if entry is not None:
+            entry[1] = time.time()
+
+
+def _live_sessions(now):
+    for student, (_, seen) in list(_session_bytes.items()):
+        if now - seen > METRICS_SESSION_IDLE_SECONDS:
+            del _session_bytes[student]
+    return [nbytes for nbytes, _ in _session_bytes.values()]
+
+
+def streamlit_memory():
+    """Streamlit's own byte counts (media files, caches, session state) by category."""
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return {}
+        rt = runtime.get_instance()
+        out = {}
+        for stats in rt.stats_mgr.get_stats(['cache_memory_bytes']).values():
+            for stat in stats:
+                out[stat.category_name] = out.get(stat.category_name, 0) + stat.byte_length
+        storage = getattr(rt.media_file_mgr, '_storage', None)
+        out['media_files'] = len(getattr(storage, '_files_by_id', {}))
+        return out
+    except Exception:
+        return {}
+
+
+def snapshot():
+    """Everything as plain data (the JSON export)."""
+    from assets import asset_stats
+    from admission import admission_stats
+    from pdf_pages import page_stats
+
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+        sessions = _live_sessions(time.time())
+    return {
+        'uptime_seconds': time.time() - _started,
+        'histograms': [
+            {'name': name, 'labels': dict(labels), 'count': sum(h[:-1]), 'sum': h[-1],
+             'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], h[:-1]))}
+            for (name, labels), h in sorted(histograms.items())
+        ],
+        'counters': [{'name': name, 'labels': dict(labels), 'value': v} for (name, labels), v in sorted(counters.items())],
+        'sessions': {'count': len(sessions), 'bytes_total': sum(sessions),
+                     'bytes_max': max(sessions, default=0)},
+        'assets': asset_stats(),
+        'fact_sheet_pages': page_stats(),
+        'admission': admission_stats(),
+        'streamlit_memory_bytes': streamlit_memory(),
+    }
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items) + '}'
+
+
+def prometheus_text():
+    snap = snapshot()
+    lines = []
+    seen = set()
+    for h in snap['histograms']:
+        name = f"exam_{h['name']}"
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(h['name'], h['name'])}")
+            lines.append(f"# TYPE {name} histogram")
+        labels = tuple(h['labels'].items())
+        cumulative = 0
+        for le, count in h['buckets'].items():
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {h['count']}")
+    for c in snap['counters']:
+        name = f"exam_{c['name']}"
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(c['name'], c['name'])}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_fmt_labels(tuple(c['labels'].items()))} {c['value']}")
+    gauges = [
+        ('exam_sessions', snap['sessions']['count']),
+        ('exam_session_state_bytes_total', snap['sessions']['bytes_total']),
+        ('exam_session_state_bytes_max', snap['sessions']['bytes_max']),
+        ('exam_asset_cache_bytes', snap['assets']['bytes']),
+        ('exam_asset_cache_files', snap['assets']['files']),
+        ('exam_fact_sheet_page_bytes', snap['fact_sheet_pages']['bytes']),
+        ('exam_fact_sheet_pages', snap['fact_sheet_pages']['pages']),
+        ('exam_admission_queued', snap['admission']['queued']),
+        ('exam_admission_starting', snap['admission']['starting']),
+        ('exam_admission_running', snap['admission']['running']),
+    ]
+    for name, value in gauges:
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    lines.append("# TYPE exam_streamlit_memory_bytes gauge")
+    for category, value in sorted(snap['streamlit_memory_bytes'].items()):
+        lines.append(f"exam_streamlit_memory_bytes{_fmt_labels([('category', category)])} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, ctype = json.dumps(snapshot()).encode('utf-8'), 'application/json'
+        elif self.path.startswith('/metrics'):
+            body, ctype = prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_exporter(port=METRICS_PORT):
+    """Serve /metrics and /metrics.json on `port` (once per process; 0 = off)."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(('0.0.0.0', port), _Handler)
+            except OSError:
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+        return _server
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ==========================================
+# SUBMISSION OUTBOX
+# ==========================================
+# "Send" only writes the payload to a local SQLite outbox and returns. A
+# background sender delivers it to the form endpoint over a pooled session
+# with timeouts, exponential backoff and a concurrency cap, so a room full of
+# students pressing the button together never blocks a script thread, and a
+# failed POST is retried instead of living only in browser memory.
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_CONNECT_TIMEOUT = float(os.getenv("OUTBOX_CONNECT_TIMEOUT", "5"))
+OUTBOX_READ_TIMEOUT = float(os.getenv("OUTBOX_READ_TIMEOUT", "15"))
+
+# Delivery states, as shown to the student
+PENDING, SENDING, DELIVERED, FAILED = 'pending', 'sending', 'delivered', 'failed'
+
+log = logging.getLogger(__name__)
+
+
+def form_url(form_id):
+    return f"https://docs.google.com/forms/d/e/{form_id}/formResponse"
+
+
+def build_payload(data, field_mapping):
+    payload = {}
+    for key, value in data.items():
+        if key in field_mapping:
+            payload[field_mapping[key]] = str(value)
+    return payload
+
+
+class Outbox:
+
+    def __init__(self, path=OUTBOX_PATH, concurrency=OUTBOX_CONCURRENCY, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 timeout=(OUTBOX_CONNECT_TIMEOUT, OUTBOX_READ_TIMEOUT), backoff_base=2.0, backoff_max=300.0,
+                 poll_interval=0.5):
+        self.path = path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, student TEXT NOT NULL, url TEXT NOT NULL,"
+            " payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL, last_error TEXT, created REAL NOT NULL, delivered_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_student ON outbox(student, id)")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="outbox")
+        self.in_flight = 0
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # ------------------------------------------------------------------
+    def enqueue(self, student, url, payload):
+        """Queue `student`'s submission and return its row id.
+
+        A student has at most one live submission: while one is pending,
+        sending or delivered, its id is returned and nothing is queued (a
+        second click must not file a second form response). Only after a
+        submission failed for good does a new one go in.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM outbox WHERE student = ? AND status IN (?, ?, ?) ORDER BY id DESC LIMIT 1",
+                    (student, PENDING, SENDING, DELIVERED),
+                ).fetchone()
+                if row is None:
+                    row_id = self.conn.execute(
+                        "INSERT INTO outbox (student, url, payload, status, next_attempt_at, created)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (student, url, json.dumps(payload, ensure_ascii=False), PENDING, now, now),
+                    ).lastrowid
+                else:
+                    row_id = row[0]
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.wakeup.set()
+        return row_id
+
+    def delivery_state(self, student):
+        """Latest submission for `student`: status, attempts, last_error, ..."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, status, attempts, last_error, created, delivered_at FROM outbox"
+                " WHERE student = ? ORDER BY id DESC LIMIT 1", (student,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'status', 'attempts', 'last_error', 'created', 'delivered_at'), row))
+
+    def latest_statuses(self):
+        """{student: status of their latest submission}, in one query."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT student, status FROM outbox WHERE id IN (SELECT MAX(id) FROM outbox GROUP BY student)"
+            ).fetchall()
+        return dict(rows)
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {PENDING: 0, SENDING: 0, DELIVERED: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def retry_failed(self):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+                (PENDING, time.time(), FAILED),
+            )
+        self.wakeup.set()
+
+    # ------------------------------------------------------------------
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._dispatch_loop, name="outbox-dispatch", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None and wait:
+            self.thread.join()
+        self.executor.shutdown(wait=wait)
+
+    def _dispatch_loop(self):
+        while not self.stopped.is_set():
+            try:
+                for row in self._claim_due():
+                    self.executor.submit(self._deliver, *row)
+            except sqlite3.Error as e:
+                # e.g. another worker held the outbox locked; claim again next poll
+                log.warning("outbox claim failed: %s", e)
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def _claim_due(self):
+        # Several worker processes may share one outbox file: claiming is one
+        # IMMEDIATE transaction, and a claim is a lease (next_attempt_at) that
+        # another sender takes over if this process dies mid-send.
+        with self.lock:
+            free = self.concurrency - self.in_flight
+            if free <= 0:
+                return []
+            now = time.time()
+            lease = now + sum(self.timeout) + 30
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT id, url, payload, attempts FROM outbox WHERE status IN (?, ?) AND next_attempt_at <= ?"
+                    " ORDER BY next_attempt_at LIMIT ?", (PENDING, SENDING, now, free)
+                ).fetchall()
+                for row in rows:
+                    self.conn.execute("UPDATE outbox SET status = ?, next_attempt_at = ? WHERE id = ?",
+                                      (SENDING, lease, row[0]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.in_flight += len(rows)
+        return rows
+
+    def _deliver(self, row_id, url, payload, attempts):
+        attempts += 1
+        error = None
+        try:
+            response = self.session.post(url, data=json.loads(payload), timeout=self.timeout)
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        now = time.time()
+        with self.lock:
+            self.in_flight -= 1
+            if error is None:
+                self.conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = NULL, delivered_at = ? WHERE id = ?",
+                    (DELIVERED, attempts, now, row_id),
+                )
+            elif attempts >= self.max_attempts:
+                self.conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                    (FAILED, attempts, error, row_id),
+                )
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                self.conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (PENDING, attempts, error, now + delay, row_id),
+                )
+        self.wakeup.set()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """The process-wide outbox, with its sender running."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox().start()
+        return _outbox
@@ -0,0 +1,97 @@
+import importlib.util
+import io
+import os
+import threading
+from collections import namedtuple
+
+from assets import get_asset
+
+# ==========================================
+# FACT-SHEET PAGE IMAGES
+# ==========================================
+# The fact-sheet PDFs are shown inside the exam as page images instead of a
+# multi-megabyte download. Each page is rendered (pypdfium2) and encoded as
+# WebP once per process and the same bytes are handed to every session, so
+# the media file manager serves one URL per page to the whole room. Pages are
+# keyed by the PDF's sha256: replacing a PDF on disk re-renders it. A page is
+# rendered the first time any student turns to it, in the request thread: a
+# background warm-up thread could still be inside pdfium when the interpreter
+# exits, which crashes the process. Without pypdfium2 installed page_count()
+# is 0 and the app falls back to download.
+
+PDF_PAGE_WIDTH = int(os.getenv("PDF_PAGE_WIDTH", "1400"))
+PDF_PAGE_QUALITY = int(os.getenv("PDF_PAGE_QUALITY", "75"))
+
+Page = namedtuple('Page', ['data', 'mime', 'width', 'height'])
+
+_docs = {}   # path -> (sha256, page count)
+_pages = {}  # (path, sha256, index) -> Page
+_lock = threading.Lock()  # pdfium is not thread-safe; also guards the dicts
+_stats = {'renders': 0, 'hits': 0}
+
+
+def available():
+    return importlib.util.find_spec('pypdfium2') is not None
+
+
+def _document(asset):
+    import pypdfium2 as pdfium
+    return pdfium.PdfDocument(asset.data)
+
+
+def page_count(path):
+    asset = get_asset(path)
+    if asset is None or not available():
+        return 0
+    doc = _docs.get(path)
+    if doc is not None and doc[0] == asset.sha256:
+        return doc[1]
+    with _lock:
+        pdf = _document(asset)
+        try:
+            count = len(pdf)
+        finally:
+            pdf.close()
+        for key in [k for k in _pages if k[0] == path and k[1] != asset.sha256]:
+            del _pages[key]
+        _docs[path] = (asset.sha256, count)
+        return count
+
+
+def page(path, index):
+    """Page `index` (0-based) of `path` as a cached WebP image, or None."""
+    asset = get_asset(path)
+    if asset is None or not 0 <= index < page_count(path):
+        return None
+    key = (path, asset.sha256, index)
+    cached = _pages.get(key)
+    if cached is not None:
+        _stats['hits'] += 1
+        return cached
+    with _lock:
+        # Another session may have rendered it while we waited for the lock
+        cached = _pages.get(key)
+        if cached is not None:
+            _stats['hits'] += 1
+            return cached
+        pdf = _document(asset)
+        try:
+            pdf_page = pdf[index]
+            scale = PDF_PAGE_WIDTH / pdf_page.get_width()
+            image = pdf_page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+        buf = io.BytesIO()
+        image.save(buf, 'WEBP', quality=PDF_PAGE_QUALITY)
+        rendered = Page(buf.getvalue(), 'image/webp', image.width, image.height)
+        _pages[key] = rendered
+        _stats['renders'] += 1
+        return rendered
+
+
+def page_stats():
+    return {
+        'pages': len(_pages),
+        'bytes': sum(len(p.data) for p in _pages.values()),
+        **_stats,
+    }
@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from multiprocessing import Pool
+
+import grade_cache
+import grading
+import similarity
+
+# ==========================================
+# OFFLINE BATCH REGRADE
+# ==========================================
+# Regrades a whole cohort export (export.py: CSV or Parquet) after the exam:
+#   1. answer-key fields and flowcharts with the deterministic scorers,
+#      REGRADE_CHUNK students per task across a process pool;
+#   2. essays (rubrics.json) and answer-key near-misses with the AI grader,
+#      through the rate-limited GradingPool and the persistent grade cache;
+#   3. near-duplicate essays (similarity.py), noted per student in
+#      {field}_similar and optionally listed as pairs (--similar).
+# Every finished grade is committed to a checkpoint file; a rerun with the
+# same input and rubrics skips what is already there. Changing the rubrics
+# starts a fresh checkpoint.
+#
+#   python regrade.py cohort.parquet --out graded.parquet
+#   python regrade.py cohort.csv --out graded.csv --fake-model   # offline
+
+REGRADE_CHUNK = int(os.getenv("REGRADE_CHUNK", "250"))
+AMBIGUOUS_PASS = float(os.getenv("AMBIGUOUS_PASS", "0.6"))  # AI score that accepts a near-miss
+
+DETERMINISTIC = '*deterministic*'  # checkpoint marker: this student's deterministic pass is stored
+SCORE_RE = re.compile(r"Score:\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def parse_score(text):
+    """0..1 from 'Score: 8/10. ...', or None if the grader did not give one."""
+    m = SCORE_RE.search(text or '')
+    if not m or float(m.group(2)) == 0:
+        return None
+    return min(1.0, float(m.group(1)) / float(m.group(2)))
+
+
+def read_cohort(path):
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    key = 'student' if 'student' in df else 'student_name'
+    df = df.drop_duplicates(subset=[key], keep='last').set_index(key, drop=False)
+    # Grades from an earlier export are recomputed, never trusted
+    from export import grade_columns
+    return df.drop(columns=[c for c in grade_columns() if c in df], errors='ignore').fillna('')
+
+
+def fingerprint(path, rubrics):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    h.update(json.dumps(rubrics, sort_keys=True).encode('utf-8'))
+    h.update(str(AMBIGUOUS_PASS).encode())
+    return h.hexdigest()
+
+
+class Checkpoint:
+
+    def __init__(self, path, fp):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades (student TEXT NOT NULL, field TEXT NOT NULL, score REAL,"
+            " status TEXT NOT NULL, detail TEXT, PRIMARY KEY (student, field))"
+        )
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        self.resumed = row is not None and row[0] == fp
+        if not self.resumed:
+            self.conn.execute("DELETE FROM grades")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fp,))
+
+    def put(self, rows):
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.execute("COMMIT")
+
+    def done(self, field):
+        return {r[0] for r in self.conn.execute("SELECT student FROM grades WHERE field = ?", (field,))}
+
+    def rows(self, status=None):
+        sql = "SELECT student, field, score, status, detail FROM grades"
+        if status:
+            return self.conn.execute(sql + " WHERE status = ?", (status,)).fetchall()
+        return self.conn.execute(sql).fetchall()
+
+
+def score_chunk(records):
+    """Deterministic grades for a list of answer dicts (runs in a worker process)."""
+    from answer_key import score_cohort
+    from flowchart import FLOWCHARTS, score_flowcharts
+
+    students = [r['_student'] for r in records]
+    scores, status, canonical = score_cohort(records)
+    charts = score_flowcharts(records)
+    fields = list(scores.columns)
+    score_rows = scores.to_numpy(dtype=float).tolist()
+    status_rows = status[fields].to_numpy().tolist()
+    canonical_rows = canonical[fields].to_numpy().tolist()
+    chart_fields = [f's{sc}_flowchart' for sc in sorted(FLOWCHARTS)]
+    chart_rows = charts.to_dict('records')
+    out = []
+    for i, student in enumerate(students):
+        for j, field in enumerate(fields):
+            out.append((student, field, score_rows[i][j], status_rows[i][j], canonical_rows[i][j]))
+        for field in chart_fields:
+            c = chart_rows[i]
+            out.append((student, field, float(c[f'{field}_score']), 'flowchart',
+                        json.dumps({'lcs': int(c[f'{field}_lcs']), 'kendall_tau': float(c[f'{field}_kendall_tau'])})))
+        out.append((student, DETERMINISTIC, None, 'done', None))
+    return out
+
+
+def run_deterministic(df, ckpt, workers, chunk):
+    done = ckpt.done(DETERMINISTIC)
+    todo = df[~df.index.isin(done)]
+    records = [{**r, '_student': s} for s, r in zip(todo.index, todo.to_dict('records'))]
+    chunks = [records[i:i + chunk] for i in range(0, len(records), chunk)]
+    started = time.perf_counter()
+    if chunks:
+        pool = Pool(workers)
+        try:
+            for rows in pool.imap_unordered(score_chunk, chunks):
+                ckpt.put(rows)
+            pool.close()
+        finally:
+            # On Ctrl-C stop the workers; finished chunks are already checkpointed
+            pool.terminate()
+            pool.join()
+    return {'students': len(records), 'skipped': len(done), 'seconds': time.perf_counter() - started}
+
+
+def ai_tasks(df, ckpt, rubrics):
+    """[(student, field, question, answer, rubric, kind)] not yet graded by the AI."""
+    from answer_key import ANSWER_KEY
+
+    graded = {(s, f) for s, f, _, status, _ in ckpt.rows() if status in ('ai', 'ai-accepted', 'ai-rejected')}
+    tasks = []
+    for field, spec in rubrics.items():
+        if field not in df:
+            continue
+        for student, answer in df[field].items():
+            if str(answer).strip() and (student, field) not in graded:
+                tasks.append((student, field, spec['question'], str(answer), spec['rubric'], 'essay'))
+    for student, field, _, _, _ in ckpt.rows('ambiguous'):
+        if (student, field) in graded or field not in df:
+            continue
+        spec = ANSWER_KEY[field]
+        tasks.append((student, field, spec.get('question', field), str(df.at[student, field]),
+                      "; ".join(spec['accept']), 'ambiguous'))
+    return tasks
+
+
+def run_ai(tasks, ckpt, model, commit_every=1.0):
+    from answer_key import normalize_text
+
+    pool = grading.GradingPool(model, cache=grade_cache.get_cache())
+    started = time.perf_counter()
+    # Identical answers to the same question are graded once
+    jobs = {}
+    for student, field, question, answer, rubric, kind in tasks:
+        key = (field, normalize_text(answer), rubric)
+        if key not in jobs:
+            jobs[key] = pool.submit(question, answer, rubric, tag=field)
+
+    pending = list(tasks)
+    done = {}  # key -> finished job, collected from the pool
+    batch, last_commit, failed = [], time.monotonic(), 0
+    try:
+        while pending:
+            still = []
+            for task in pending:
+                student, field, _, answer, rubric, kind = task
+                key = (field, normalize_text(answer), rubric)
+                if key not in done:
+                    job = pool.collect(jobs[key])
+                    if job is None:
+                        still.append(task)
+                        continue
+                    done[key] = job
+                job = done[key]
+                score = parse_score(job['result']) if job['status'] == 'done' else None
+                if score is None:
+                    failed += 1  # not checkpointed: retried on the next run
+                    continue
+                if kind == 'ambiguous':
+                    passed = score >= AMBIGUOUS_PASS
+                    batch.append((student, field, 1.0 if passed else 0.0,
+                                  'ai-accepted' if passed else 'ai-rejected', job['result']))
+                else:
+                    batch.append((student, field, score, 'ai', job['result']))
+            pending = still
+            if batch and time.monotonic() - last_commit >= commit_every:
+                ckpt.put(batch)
+                batch, last_commit = [], time.monotonic()
+            if pending:
+                time.sleep(0.05)
+    finally:
+        # Keep whatever finished, even on Ctrl-C; queued calls are dropped
+        if batch:
+            ckpt.put(batch)
+        pool.executor.shutdown(wait=not pending, cancel_futures=True)
+    statuses = [done.get(key) or pool.status(j) for key, j in jobs.items()]
+    statuses = [s for s in statuses if s is not None]
+    return {
+        'answers': len(tasks), 'unique': len(jobs), 'failed': failed,
+        'model_calls': sum(s['attempts'] for s in statuses),
+        'cache_hits': sum(1 for s in statuses if s['cached']),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def find_similar(df, fields):
+    fields = [f for f in fields if f in df]
+    return similarity.scan(zip(df.index, df[fields].to_dict('records')), fields)
+
+
+def write_results(df, ckpt, out, peers=None):
+    import pandas as pd
+
+    wide = {}
+    for student, field, score, status, detail in ckpt.rows():
+        if field == DETERMINISTIC or student not in df.index:
+            continue
+        row = wide.setdefault(student, {})
+        row[f'{field}_score'] = score
+        row[f'{field}_status'] = status
+        if status.startswith('ai'):
+            row[f'{field}_feedback'] = detail
+    for (student, field), others in (peers or {}).items():
+        wide.setdefault(student, {})[f'{field}_similar'] = others
+    grades = pd.DataFrame.from_dict(wide, orient='index').reindex(df.index)
+    grades = grades.reindex(columns=sorted(grades.columns))
+    score_cols = [c for c in grades.columns if c.endswith('_score')]
+    grades['total_score'] = grades[score_cols].astype(float).sum(axis=1)
+    result = pd.concat([df.reset_index(drop=True), grades.reset_index(drop=True)], axis=1)
+    if out.endswith('.parquet'):
+        result.to_parquet(out, index=False)
+    else:
+        result.to_csv(out, index=False)
+    return len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regrade an exported cohort offline")
+    parser.add_argument("input", help="cohort file from export.py (.csv or .parquet)")
+    parser.add_argument("--out", required=True, help="graded results (.csv or .parquet)")
+    parser.add_argument("--rubrics", default="rubrics.json")
+    parser.add_argument("--checkpoint", default=None, help="default: <out>.ckpt.sqlite3")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk", type=int, default=REGRADE_CHUNK)
+    parser.add_argument("--no-ai", action="store_true", help="deterministic scorers only")
+    parser.add_argument("--fake-model", action="store_true", help="offline stand-in for the AI grader")
+    parser.add_argument("--similar", default=None, help="also write near-duplicate essay pairs (CSV) here")
+    args = parser.parse_args()
+
+    with open(args.rubrics, encoding='utf-8') as f:
+        rubrics = json.load(f)
+    started = time.perf_counter()
+    df = read_cohort(args.input)
+    ckpt = Checkpoint(args.checkpoint or args.out + ".ckpt.sqlite3", fingerprint(args.input, rubrics))
+    print(f"{len(df)} students from {args.input}" + (" (resuming)" if ckpt.resumed else ""))
+
+    det = run_deterministic(df, ckpt, args.workers, args.chunk)
+    print(f"deterministic: {det['students']} students in {det['seconds']:.2f}s "
+          f"({det['students'] / max(det['seconds'], 1e-9):.0f}/s), {det['skipped']} from checkpoint")
+
+    if not args.no_ai:
+        model = grading.FakeModel(latency=0.05, jitter=0.02) if args.fake_model \
+            else grading.get_model(os.getenv("GOOGLE_API_KEY"))
+        if model is None:
+            print("AI grading skipped: set GOOGLE_API_KEY or pass --fake-model")
+        else:
+            tasks = ai_tasks(df, ckpt, rubrics)
+            ai = run_ai(tasks, ckpt, model)
+            print(f"AI: {ai['answers']} answers ({ai['unique']} unique) in {ai['seconds']:.2f}s "
+                  f"({ai['unique'] / max(ai['seconds'], 1e-9):.1f} grades/s), {ai['model_calls']} model calls, "
+                  f"{ai['cache_hits']} cache hits, {ai['failed']} failed")
+
+    indexes = find_similar(df, rubrics)
+    pairs = similarity.pair_rows(indexes)
+    print(f"similarity: {sum(i.essays for i in indexes.values())} essays, {len(pairs)} similar pairs")
+    if args.similar:
+        with open(args.similar, 'w', newline='', encoding='utf-8') as f:
+            similarity.write_pairs(f, indexes)
+
+    rows = write_results(df, ckpt, args.out, similarity.peers(indexes))
+    elapsed = time.perf_counter() - started
+    print(f"wrote {rows} students to {args.out} in {elapsed:.2f}s total ({rows / max(elapsed, 1e-9):.0f} students/s)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        raise SystemExit("interrupted: finished grades are in the checkpoint, rerun the same command to resume")
@@ -0,0 +1,430 @@
+from collections import namedtuple
+
+from flowchart import FLOWCHARTS, flowchart_blocks
+
+# ==========================================
+# SCENARIO REGISTRY
+# ==========================================
+# Every scenario, phase, question, answer key and Google Form entry id is
+# written down once, in SCENARIOS below. At import the data is checked and
+# compiled into read-only tuples (namedtuples, no per-instance __dict__):
+#   PHASES[(sc, ph)]  Phase(scenario, phase, static, body, fields)
+#   FIELDS[name]      Field(name, entry, widget_key, essay, key)
+# and the lookups the rest of the exam needs (FIELD_MAPPING, ANSWER_FIELDS,
+# PDF_MAP, ...). Compiling happens once per process; app.py only walks the
+# blocks of the current phase on each rerun. `static` blocks render with the
+# full script (videos, images), `body` blocks inside the phase's fragment.
+#
+# Block specs:
+#   ('subheader' | 'markdown' | 'info', text)   ('divider',)
+#   ('video' | 'image', path, caption, message when the file is missing)
+#   ('columns', [blocks of column 1], [blocks of column 2], ...)
+#   ('flowchart',)                               Phase 2 sort_items
+#   question dicts: {'field', 'widget': text | textarea | radio | select,
+#                    'label', 'entry', optional 'key', 'options', 'height',
+#                    'essay'}
+# A question's 'key' is its answer_key.py spec: {'correct': option} for a
+# choice, or {'question': ..., 'accept': {canonical: [aliases]}} for a term.
+
+STUDENT_FIELD = ('student_name', 'entry.1428432169')
+
+IMMUNITY_TYPES = ["Active", "Passive"]
+IMMUNITY_ROLES = ["Immediate Neutralization", "Long-term Memory"]
+S2_HORMONES = ["Insulin", "Glucagon", "Growth hormone", "Cortisol", "Catecholamine", "Aldosterone", "Vasopressin", "PTH"]
+S2_HORMONE_ENTRIES = [
+    ('entry.1034834794', 'entry.1826209674', 'entry.164598416'),
+    ('entry.1904032084', 'entry.1220042795', 'entry.287683897'),
+    ('entry.1794613146', 'entry.1471211990', 'entry.1516921212'),
+]
+S5_DRUGS = [
+    ('rv', "Rabies Vaccine", 'entry.105114659', 'Active', 'entry.105140345', 'Long-term Memory'),
+    ('rig', "Rabies Immunoglobulin", 'entry.105143329', 'Passive', 'entry.105180974', 'Immediate Neutralization'),
+    ('tt', "Tetanus Toxoid", 'entry.105255638', 'Active', 'entry.105276227', 'Long-term Memory'),
+    ('tat', "Tetanus Antitoxin", 'entry.105283767', 'Passive', 'entry.105292936', 'Immediate Neutralization'),
+]
+
+# Either box of 1.3 may hold either group
+CHEMICAL_GROUPS = {
+    'question': "Chemical group causing the symptoms",
+    'accept': {
+        'Organophosphate': ['organophosphate', 'organophosphates', 'organophosphorus', 'OP',
+                            'ออร์กาโนฟอสเฟต', 'ออร์แกโนฟอสเฟต', 'สารกำจัดแมลงกลุ่มออร์กาโนฟอสเฟต'],
+        'Carbamate': ['carbamate', 'carbamates', 'คาร์บาเมต', 'คาร์บาเมท'],
+    },
+}
+
+
+def _essay(field, label, entry, height=80):
+    return {'field': field, 'widget': 'textarea', 'label': label, 'entry': entry, 'height': height, 'essay': True}
+
+
+SCENARIOS = {
+    # ========================
+    # SCENARIO 1
+    # ========================
+    1: {
+        'fact_sheet': None,
+        1: {
+            'static': [
+                ('subheader', "Scenario 1: ชาวสวนถูกหามส่งโรงพยาบาลด้วยอาการน้ำลายฟูมปาก..."),
+                ('columns',
+                 [('info', "VDO 1: อาการที่ขา"), ('video', "Question1_VDO1.mp4", None, "ไม่พบไฟล์ VDO1")],
+                 [('info', "VDO 2: อาการที่ตา"), ('video', "Question1_VDO2.mp4", None, "ไม่พบไฟล์ VDO2")]),
+                ('divider',),
+            ],
+            'body': [
+                ('markdown', "### 1.1 จาก VDO 1 และ VDO 2 จงระบุชื่อเรียกทางการแพทย์ (Medical Term) ของอาการที่เกิดขึ้น"),
+                ('columns',
+                 [{'field': 's1_p1_vdo1', 'widget': 'text', 'label': "VDO 1 (Leg):", 'entry': 'entry.1697216375',
+                   'key': {'question': "VDO 1 (Leg): Medical term for the leg symptom",
+                           'accept': {'Fasciculation': ['fasciculation', 'fasciculations', 'muscle fasciculation',
+                                                        'muscle twitching', 'กล้ามเนื้อกระตุก', 'กล้ามเนื้อเต้นระริก']}}}],
+                 [{'field': 's1_p1_vdo2', 'widget': 'text', 'label': "VDO 2 (Eye):", 'entry': 'entry.1874226739',
+                   'key': {'question': "VDO 2 (Eye): Medical term for the eye symptom",
+                           'accept': {'Miosis': ['miosis', 'myosis', 'pinpoint pupil', 'pinpoint pupils',
+                                                 'pupil constriction', 'รูม่านตาหด', 'ม่านตาหด']}}}]),
+                {'field': 's1_p1_system', 'widget': 'radio', 'entry': 'entry.2095042542',
+                 'label': "1.2 กลุ่มอาการดังกล่าว บ่งบอกถึงภาวะ Overstimulation ของระบบประสาทส่วนใด?",
+                 'options': ["Sympathetic", "Parasympathetic", "Somatic", "Central"],
+                 'key': {'correct': "Parasympathetic"}},
+                ('markdown', "### 1.3 จงระบุชื่อ \"กลุ่มสารเคมี\" (Chemical Group) ที่เป็นสาเหตุที่เป็นไปได้มา 2 กลุ่ม"),
+                ('columns',
+                 [{'field': 's1_p1_chem1', 'widget': 'text', 'label': "1.", 'entry': 'entry.696616887',
+                   'key': CHEMICAL_GROUPS}],
+                 [{'field': 's1_p1_chem2', 'widget': 'text', 'label': "2.", 'entry': 'entry.698531293',
+                   'key': CHEMICAL_GROUPS}]),
+            ],
+        },
+        2: {
+            'body': [
+                ('subheader', "Scenario 1: Mechanism (Drag & Drop)"),
+                ('info', "จงลากกล่องข้อความมาวางเรียงลำดับ..."),
+                ('flowchart',),
+            ],
+        },
+        3: {
+            'body': [
+                ('subheader', "Scenario 1: Synthesis & Application"),
+                ('markdown', "**3.1** จงอธิบายกลไกการออกฤทธิ์ของ Atropine..."),
+                _essay('s1_essay1', "คำตอบ 3.1:", 'entry.1913130773', height=100),
+                ('markdown', "**3.2** ทำไม Atropine ถึง *ไม่ช่วย* แก้อาการกล้ามเนื้อกระตุก?"),
+                _essay('s1_essay2', "คำตอบ 3.2:", 'entry.1292504947', height=100),
+            ],
+        },
+    },
+    # ========================
+    # SCENARIO 2
+    # ========================
+    2: {
+        'fact_sheet': "Medical Fact Sheet_Scenario2.pdf",
+        1: {
+            'body': [
+                ('subheader', "Scenario 2: เด็กวัยรุ่นชาย อายุ 17 ปี หมดสติ หายใจหอบลึก..."),
+                ('markdown', """
+    **ประวัติ**: ปัสสาวะบ่อยและน้ำหนักลดมา 1 เดือน  
+    **ผลตรวจทางห้องปฏิบัติการ**:  
+    - Glucose: 450 mg/dL  
+    - pH: 7.15  
+    - HCO₃⁻: 12 mEq/L  
+    - Ketone (Urine): Positive 4+  
+    """),
+            ] + [
+                # Hormone and change are keyed as a pair (answer_key.DERIVED_FIELDS)
+                ('columns',
+                 [{'field': f's2_hormone_{i}', 'widget': 'select', 'label': f"ฮอร์โมน {i+1}",
+                   'options': S2_HORMONES, 'entry': hormone}],
+                 [{'field': f's2_change_{i}', 'widget': 'radio', 'label': "การเปลี่ยนแปลง",
+                   'options': ["Increase", "Decrease"], 'entry': change}],
+                 [{'field': f's2_mech_{i}', 'widget': 'text', 'label': "ผลที่เกิดขึ้น (Mechanism Key)",
+                   'entry': mech, 'essay': True}])
+                for i, (hormone, change, mech) in enumerate(S2_HORMONE_ENTRIES)
+            ],
+        },
+        2: {
+            'body': [
+                ('subheader', "Scenario 2: กลไกการเกิดเลือดเป็นกรด"),
+                ('flowchart',),
+            ],
+        },
+        3: {
+            'body': [
+                ('subheader', "Scenario 2: Synthesis"),
+                ('markdown', "**3.1** ... Kussmaul breathing ..."),
+                _essay('s2_essay1', "คำตอบ 3.1:", 'entry.1177067011'),
+                ('markdown', "**3.2** ... Hypokalemia ..."),
+                _essay('s2_essay2', "คำตอบ 3.2:", 'entry.1474268199'),
+            ],
+        },
+    },
+    # ========================
+    # SCENARIO 3
+    # ========================
+    3: {
+        'fact_sheet': "Medical Fact Sheet_Scenario3.pdf",
+        1: {
+            'static': [
+                ('subheader', "Scenario 3: เด็กชายอายุ 8 ปี มีอาการซีด เรื้อรัง ตัวเหลือง ตับและม้ามโต"),
+                ('markdown', """
+    **ประวัติ**: พัฒนาการช้า  
+    **ผลตรวจเลือด**:  
+    - MCV: 65 fL  
+    - Hb: 6.0 g/dL  
+    - Hb typing: HbA2 10%, HbF 90%  
+    **Blood Smear**: Microcytic, Hypochromic, Target cells
+    """),
+                ('image', "pedigree.jpg", "Pedigree Chart", "⚠️ ไม่พบไฟล์ pedigree.jpg"),
+            ],
+            'body': [
+                ('markdown', "**คำสั่ง**: จงตอบคำถามต่อไปนี้"),
+                {'field': 's3_diagnosis', 'widget': 'text', 'label': "1. Diagnosis: ผู้ป่วยรายนี้เป็นโรคอะไร?",
+                 'entry': 'entry.104900991',
+                 'key': {'question': "Diagnosis of an 8-year-old with microcytic hypochromic anaemia, HbA2 10%, HbF 90%",
+                         'accept': {'Beta thalassemia': ['beta thalassemia', 'beta thalassaemia', 'β-thalassemia',
+                                                         'beta thalassemia major', 'homozygous beta thalassemia',
+                                                         "cooley's anemia", 'thalassemia major',
+                                                         'เบต้าธาลัสซีเมีย', 'เบตาธาลัสซีเมีย']}}},
+                {'field': 's3_inheritance', 'widget': 'radio', 'label': "2. Inheritance Pattern: ...",
+                 'options': ["Autosomal dominant", "Autosomal recessive", "X-linked"], 'entry': 'entry.104900996',
+                 'key': {'correct': "Autosomal recessive"}},
+                {'field': 's3_chance', 'widget': 'text', 'label': "3. Chance: ... (%)", 'entry': 'entry.104907871'},
+            ],
+        },
+        2: {
+            'body': [
+                ('subheader', "Scenario 3: กลไกการเกิดโรคธาลัสซีเมีย"),
+                ('flowchart',),
+            ],
+        },
+        3: {
+            'body': [
+                ('subheader', "Scenario 3: Synthesis"),
+                ('markdown', "**3.1** ... เหล็กเกิน ..."),
+                _essay('s3_essay1', "คำตอบ 3.1:", 'entry.104932597'),
+                ('markdown', "**3.2** ... CRISPR-Cas9 ..."),
+                _essay('s3_essay2', "คำตอบ 3.2:", 'entry.104940377'),
+            ],
+        },
+    },
+    # ========================
+    # SCENARIO 4
+    # ========================
+    4: {
+        'fact_sheet': "Medical Fact Sheet_Scenario4.pdf",
+        1: {
+            'body': [
+                ('subheader', "Scenario 4: ชายชาวประมง ประสบเหตุเรืออับปาง..."),
+                ('markdown', """
+    **Vital Signs**: BP 80/50 mmHg, Pulse 110 bpm  
+    **ผลตรวจร่างกาย**: ปากแห้งมาก, ปลายมือเท้าขาวซีดเย็น  
+    **Urine**: Specific Gravity 1.040  
+    **Blood Osmolarity**: 320 mOsm/L
+    """),
+                ('markdown', "### 1. อาการหัวใจเต้นเร็ว... เกิดจากการตอบสนองของระบบประสาทส่วน ________ ร่วมกับฮอร์โมน ________ ซึ่งหลั่งจาก ________"),
+                ('columns',
+                 [{'field': 's4_q1_system', 'widget': 'text', 'label': "1.1 ระบบประสาทส่วน", 'entry': 'entry.104976657',
+                   'key': {'question': "Division of the nervous system causing tachycardia in shock",
+                           'accept': {'Sympathetic': ['sympathetic', 'sympathetic nervous system',
+                                                      'ระบบประสาทซิมพาเทติก', 'ซิมพาเทติก', 'ซิมพาธิติก']}}}],
+                 [{'field': 's4_q1_hormone', 'widget': 'text', 'label': "1.2 ฮอร์โมน", 'entry': 'entry.104983229',
+                   'key': {'question': "Hormone acting with the sympathetic response in shock",
+                           'accept': {'Epinephrine': ['epinephrine', 'adrenaline', 'adrenalin', 'อะดรีนาลีน',
+                                                      'เอพิเนฟริน', 'อิพิเนฟริน', 'epinephrine norepinephrine',
+                                                      'adrenaline noradrenaline']}}}],
+                 [{'field': 's4_q1_source', 'widget': 'text', 'label': "1.3 หลั่งจาก", 'entry': 'entry.105054184',
+                   'key': {'question': "Gland secreting that hormone",
+                           'accept': {'Adrenal medulla': ['adrenal medulla', 'ต่อมหมวกไตชั้นใน', 'อะดรีนัลเมดัลลา']}}}]),
+                ('markdown', "### 2. Kidney Function: ... เป็นผลจากฮอร์โมน ________ ซึ่งออกฤทธิ์ที่ ________"),
+                ('columns',
+                 [{'field': 's4_q2_hormone', 'widget': 'text', 'label': "2.1 ฮอร์โมน", 'entry': 'entry.105072213',
+                   'key': {'question': "Hormone concentrating urine (SG 1.040) in dehydration",
+                           'accept': {'ADH': ['adh', 'antidiuretic hormone', 'vasopressin', 'arginine vasopressin',
+                                              'avp', 'วาโซเพรสซิน', 'ฮอร์โมนต้านการขับปัสสาวะ']}}}],
+                 [{'field': 's4_q2_site', 'widget': 'text', 'label': "2.2 ออกฤทธิ์ที่", 'entry': 'entry.105082017',
+                   'key': {'question': "Nephron site where that hormone acts",
+                           'accept': {'Collecting duct': ['collecting duct', 'collecting tubule', 'ท่อรวม',
+                                                          'ท่อรวมของไต', 'distal tubule and collecting duct',
+                                                          'dct and collecting duct']}}}]),
+            ],
+        },
+        2: {
+            'body': [
+                ('subheader', "Scenario 4: กลไกกู้ความดันโลหิต"),
+                ('flowchart',),
+            ],
+        },
+        3: {
+            'body': [
+                ('subheader', "Scenario 4: Synthesis"),
+                ('markdown', "**3.1** ... ดื่มน้ำทะเล ..."),
+                _essay('s4_essay1', "คำตอบ 3.1:", 'entry.105085109'),
+                ('markdown', "**3.2** ... เลือกสารน้ำ ..."),
+                {'field': 's4_choice', 'widget': 'select', 'label': "เลือกสารน้ำ:", 'entry': 'entry.105110463',
+                 'options': ["Normal saline (0.9% NaCl)", "0.45% NaCl", "5% Dextrose/Water", "Plasma", "Whole blood"],
+                 'key': {'correct': "Normal saline (0.9% NaCl)"}},
+                _essay('s4_reason', "เหตุผล:", 'entry.105112557'),
+            ],
+        },
+    },
+    # ========================
+    # SCENARIO 5
+    # ========================
+    5: {
+        'fact_sheet': "Medical Fact Sheet_Scenario5.pdf",
+        1: {
+            'body': [
+                ('subheader', "Scenario 5: นายเอ ถูกสุนัขจรจัดกัด..."),
+                ('markdown', """
+    **แพทย์สั่งจ่ายยา 4 ชนิด**:  
+    1. Rabies Vaccine  
+    2. Rabies Immunoglobulin  
+    3. Tetanus Toxoid  
+    4. Tetanus Antitoxin
+    """),
+            ] + [
+                question
+                for drug, name, type_entry, type_answer, role_entry, role_answer in S5_DRUGS
+                for question in (
+                    {'field': f's5_{drug}_type', 'widget': 'radio', 'label': f"{name} - ประเภทภูมิคุ้มกัน",
+                     'options': IMMUNITY_TYPES, 'entry': type_entry, 'key': {'correct': type_answer}},
+                    {'field': f's5_{drug}_role', 'widget': 'radio', 'label': f"{name} - หน้าที่หลัก",
+                     'options': IMMUNITY_ROLES, 'entry': role_entry, 'key': {'correct': role_answer}},
+                )
+            ],
+        },
+        2: {
+            'body': [
+                ('subheader', "Scenario 5: กลไกการป้องกันโรคพิษสุนัขบ้า"),
+                ('flowchart',),
+            ],
+        },
+        3: {
+            'body': [
+                ('subheader', "Scenario 5: Synthesis & Application"),
+                ('markdown', "**3.1** ... RIG ที่แผล ..."),
+                _essay('s5_essay1', "คำตอบ 3.1:", 'entry.105293666'),
+                ('markdown', "**3.2** ... ไม่ฉีด TAT ..."),
+                _essay('s5_essay2', "คำตอบ 3.2:", 'entry.105302093'),
+            ],
+        },
+    },
+}
+
+# Widget keys kept from before the registry, so live sessions and journals
+# restored across a deploy still find their values (default: the field name)
+WIDGET_KEY_OVERRIDES = {
+    **{f's2_hormone_{i}': f's2_h{i}' for i in range(3)},
+    **{f's2_change_{i}': f's2_c{i}' for i in range(3)},
+    **{f's2_mech_{i}': f's2_m{i}' for i in range(3)},
+    's3_diagnosis': 's3_diag',
+    's3_inheritance': 's3_inherit',
+    's4_choice': 's4_fluid_choice',
+    **{f's5_{d}_{f}': f'{d}_{f}' for d in ('rv', 'rig', 'tt', 'tat') for f in ('type', 'role')},
+}
+
+# ==========================================
+# COMPILED FORM
+# ==========================================
+Phase = namedtuple('Phase', ['scenario', 'phase', 'static', 'body', 'fields'])
+Field = namedtuple('Field', ['name', 'entry', 'widget_key', 'essay', 'key'])
+Text = namedtuple('Text', ['style', 'body'])
+Media = namedtuple('Media', ['kind', 'path', 'caption', 'missing'])
+Columns = namedtuple('Columns', ['columns'])
+Question = namedtuple('Question', ['field', 'widget', 'label', 'options', 'height'])
+Flowchart = namedtuple('Flowchart', ['scenario', 'blocks'])
+
+TEXT_STYLES = ('subheader', 'markdown', 'info', 'divider')
+WIDGETS = ('text', 'textarea', 'radio', 'select')
+
+
+def _answer_key(spec, q):
+    if spec is None:
+        return None
+    if 'correct' in spec:
+        if spec['correct'] not in q['options']:
+            raise ValueError(f"{q['field']}: answer {spec['correct']!r} is not one of its options")
+        return {'kind': 'choice', 'accept': {spec['correct']: [spec['correct']]}}
+    if not spec.get('accept'):
+        raise ValueError(f"{q['field']}: answer key needs 'correct' or 'accept'")
+    return {'kind': 'term', 'question': spec['question'], 'accept': spec['accept']}
+
+
+def _compile_block(block, sc, fields):
+    if isinstance(block, dict):
+        widget = block['widget']
+        if widget not in WIDGETS:
+            raise ValueError(f"{block['field']}: unknown widget {widget!r}")
+        if widget in ('radio', 'select') and not block.get('options'):
+            raise ValueError(f"{block['field']}: {widget} needs options")
+        name = block['field']
+        fields.append(Field(name, block['entry'], WIDGET_KEY_OVERRIDES.get(name, name),
+                            block.get('essay', False), _answer_key(block.get('key'), block)))
+        return Question(fields[-1], widget, block['label'], tuple(block.get('options', ())), block.get('height'))
+    kind = block[0]
+    if kind in TEXT_STYLES:
+        return Text(kind, block[1] if len(block) > 1 else None)
+    if kind in ('video', 'image'):
+        return Media(*block)
+    if kind == 'columns':
+        return Columns(tuple(tuple(_compile_block(b, sc, fields) for b in col) for col in block[1:]))
+    if kind == 'flowchart':
+        if sc not in FLOWCHARTS:
+            raise ValueError(f"Scenario {sc}: no flowchart in flowchart.FLOWCHARTS")
+        return Flowchart(sc, tuple(flowchart_blocks(sc)))
+    raise ValueError(f"Scenario {sc}: unknown block {kind!r}")
+
+
+def compile_scenarios(scenarios):
+    """{(sc, ph): Phase} from the SCENARIOS data; ValueError if it is inconsistent."""
+    if sorted(scenarios) != list(range(1, len(scenarios) + 1)):
+        raise ValueError("Scenarios must be numbered 1..n")
+    phases = {}
+    seen = {}
+    for sc, spec in scenarios.items():
+        for ph in (1, 2, 3):
+            if ph not in spec:
+                raise ValueError(f"Scenario {sc}: missing phase {ph}")
+            fields = []
+            static = tuple(_compile_block(b, sc, fields) for b in spec[ph].get('static', ()))
+            body = tuple(_compile_block(b, sc, fields) for b in spec[ph].get('body', ()))
+            phases[sc, ph] = Phase(sc, ph, static, body, tuple(fields))
+            for field in fields:
+                for attr in ('name', 'entry', 'widget_key'):
+                    value = getattr(field, attr)
+                    if (attr, value) in seen:
+                        raise ValueError(f"{field.name}: {attr} {value!r} already used by {seen[attr, value]}")
+                    seen[attr, value] = field.name
+    if ('entry', STUDENT_FIELD[1]) in seen:
+        raise ValueError(f"{STUDENT_FIELD[1]} is the student name entry")
+    return phases
+
+
+PHASES = compile_scenarios(SCENARIOS)
+LAST_SCENARIO = max(SCENARIOS)
+FIELDS = {f.name: f for ph in PHASES.values() for f in ph.fields}
+
+# Derived lookups, in form order
+FIELD_MAPPING = {STUDENT_FIELD[0]: STUDENT_FIELD[1], **{name: f.entry for name, f in FIELDS.items()}}
+# Everything a student answers, form fields and flowcharts, for exports
+ANSWER_FIELDS = [STUDENT_FIELD[0]] + [
+    name for ph in PHASES.values()
+    for name in [f.name for f in ph.fields] + [f's{b.scenario}_flowchart' for b in ph.body if isinstance(b, Flowchart)]
+]
+ESSAY_FIELDS = [name for name, f in FIELDS.items() if f.essay]
+KEYED_FIELDS = {name: f.key for name, f in FIELDS.items() if f.key is not None}
+PDF_MAP = {sc: spec['fact_sheet'] for sc, spec in SCENARIOS.items() if spec.get('fact_sheet')}
+
+
+def media(phases=None):
+    """Media blocks shown by `phases` (default: every phase)."""
+    def walk(blocks):
+        for block in blocks:
+            if isinstance(block, Media):
+                yield block
+            elif isinstance(block, Columns):
+                for col in block.columns:
+                    yield from walk(col)
+    return [m for ph in (phases or PHASES.values()) for m in walk(ph.static + ph.body)]
+
+
+# Prefetched while students wait for the start signal
+FIRST_VIDEOS = [m.path for m in media([PHASES[1, 1]]) if m.kind == 'video']
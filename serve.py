@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import signal
+import subprocess
+import sys
+
+# ==========================================
+# MULTI-WORKER LAUNCHER
+# ==========================================
+# Runs N `streamlit run app.py` workers on one machine, sharing the exam
+# through the SQLite state store (EXAM_STORE=sqlite) and the journal/outbox
+# files, behind a small HTTP-aware TCP balancer. The balancer is sticky per
+# browser: a connection without the WORKER_COOKIE goes to the next worker in
+# turn and the first response sets the cookie, so the student's websocket and
+# media requests (videos live in the memory of the worker that rendered them)
+# all reach that worker. Stickiness is not per client IP: a school room
+# behind one NAT address would otherwise land on a single worker.
+#
+#   python serve.py --workers 4 --port 8501
+#   python serve.py --reset     # start from WAIT; the exam state survives restarts
+#
+# Behind nginx/HAProxy instead, start the workers with --no-proxy and stick
+# on a cookie too (HAProxy `cookie SERVERID insert`, nginx `sticky cookie`).
+# ip_hash / `balance source` put a whole NAT'd room on one worker.
+
+WORKER_COOKIE = "exam_worker"
+_COOKIE = re.compile(rb"\r\ncookie:[^\r\n]*?\b" + WORKER_COOKIE.encode() + rb"=(\d+)", re.IGNORECASE)
+
+
+def worker_env():
+    return {**os.environ, 'EXAM_STORE': 'sqlite'}
+
+
+def start_workers(n, base_port, app="app.py"):
+    workers = []
+    for i in range(n):
+        port = base_port + i
+        workers.append((port, subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", app,
+             "--server.headless", "true", "--server.port", str(port),
+             "--browser.gatherUsageStats", "false"],
+            env=worker_env(),
+        )))
+    return workers
+
+
+def cookie_port(head, ports):
+    """The worker named by the request's WORKER_COOKIE, or None."""
+    match = _COOKIE.search(head)
+    port = int(match.group(1)) if match else None
+    return port if port in ports else None
+
+
+def set_cookie(head, port):
+    """Response head with the WORKER_COOKIE added after the status line."""
+    status, _, rest = head.partition(b"\r\n")
+    cookie = f"Set-Cookie: {WORKER_COOKIE}={port}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+    return status + b"\r\n" + cookie + rest
+
+
+async def read_head(reader):
+    # Request/response line + headers; whatever arrived if that is not HTTP
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        return await reader.read(65536)
+
+
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def proxy(host, port, ports):
+    turn = itertools.cycle(ports)
+
+    async def handle(client_reader, client_writer):
+        head = await read_head(client_reader)
+        port = cookie_port(head, ports)
+        assign = port is None
+        if assign:
+            port = next(turn)
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            client_writer.close()
+            return
+        upstream_writer.write(head)
+        if assign:
+            response = await read_head(upstream_reader)
+            client_writer.write(set_cookie(response, port) if response.startswith(b"HTTP/") else response)
+        await asyncio.gather(pipe(client_reader, upstream_writer), pipe(upstream_reader, client_writer))
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several app.py workers behind a sticky balancer")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--worker-port", type=int, default=8601, help="first worker port")
+    parser.add_argument("--no-proxy", action="store_true", help="only start the workers")
+    parser.add_argument("--reset", action="store_true", help="put the shared exam back to WAIT first")
+    args = parser.parse_args()
+
+    if args.reset:
+        # The SQLite exam state outlives the workers; a rehearsal leaves it RUNNING
+        os.environ['EXAM_STORE'] = 'sqlite'
+        import coordinator
+        print(f"exam reset: {coordinator.reset_exam().status}")
+
+    workers = start_workers(args.workers, args.worker_port)
+    ports = [port for port, _ in workers]
+    print(f"workers on ports {ports[0]}-{ports[-1]} (EXAM_STORE=sqlite)")
+    try:
+        if args.no_proxy:
+            for _, proc in workers:
+                proc.wait()
+        else:
+            print(f"exam at http://{args.host}:{args.port}")
+            asyncio.run(proxy(args.host, args.port, ports))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, proc in workers:
+            proc.send_signal(signal.SIGTERM)
+        for _, proc in workers:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
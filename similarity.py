@@ -0,0 +1,240 @@
+import argparse
+import csv
+import io
+import os
+import re
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+
+import journal
+from scenarios import ESSAY_FIELDS
+
+# ==========================================
+# ESSAY SIMILARITY (MinHash / LSH)
+# ==========================================
+# Flags near-duplicate essays for integrity review without comparing every
+# pair of students. Per question:
+#   1. each essay becomes a set of shingles: Thai is written without spaces
+#      between words, so Thai runs give character THAI_NGRAM-grams; Latin
+#      words and numbers give word WORD_NGRAM-grams;
+#   2. a SIMILARITY_PERMUTATIONS-value MinHash signature per essay;
+#   3. the signature is cut into SIMILARITY_BANDS bands; essays sharing any
+#      band land in the same bucket and become a candidate pair;
+#   4. candidates are screened by signature agreement (vectorized), then
+#      checked with the exact Jaccard similarity of their shingle sets; pairs
+#      at or above SIMILARITY_THRESHOLD are reported.
+# Only essays that share a bucket are ever compared, so a cohort costs
+# roughly linear time instead of n^2 comparisons. Identical essays (the same
+# shingle set, e.g. a pasted textbook answer) are indexed once as a group:
+# each copy is reported against the group's first student with similarity
+# 1.0, and near-duplicates of the group are reported for that first student,
+# so m copies cost m rows instead of m^2 pairs. Used by export.py (--similar)
+# and regrade.py, or directly:
+#
+#   python similarity.py --out similar.csv --journal /srv/exam/journal.sqlite3
+
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+SIMILARITY_PERMUTATIONS = int(os.getenv("SIMILARITY_PERMUTATIONS", "120"))
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", "20"))
+SIMILARITY_MIN_SHINGLES = int(os.getenv("SIMILARITY_MIN_SHINGLES", "8"))  # shorter essays are skipped
+MINHASH_MARGIN = 0.1  # ~2.5 standard errors of a 120-value MinHash estimate near 0.7
+THAI_NGRAM = 4
+WORD_NGRAM = 3
+
+
+PAIR_COLUMNS = ['field', 'student_a', 'student_b', 'similarity']
+
+_TOKEN = re.compile(r"[\u0E00-\u0E7F]+|[^\W_\u0E00-\u0E7F]+")
+_THAI = re.compile(r"[\u0E00-\u0E7F]")
+_PRIME = (1 << 32) + 15  # > every 32-bit shingle hash
+
+
+def shingles(text):
+    """Set of shingle strings for one essay (Thai character n-grams, other word n-grams)."""
+    text = unicodedata.normalize('NFC', '' if text is None else str(text)).lower()
+    out = set()
+    words = []
+    for tok in _TOKEN.findall(text):
+        if _THAI.match(tok):
+            if len(tok) <= THAI_NGRAM:
+                out.add(tok)
+            else:
+                out.update(tok[i:i + THAI_NGRAM] for i in range(len(tok) - THAI_NGRAM + 1))
+        else:
+            words.append(tok)
+    if 0 < len(words) < WORD_NGRAM:
+        out.add(' '.join(words))
+    out.update(' '.join(words[i:i + WORD_NGRAM]) for i in range(len(words) - WORD_NGRAM + 1))
+    return out
+
+
+def shingle_hashes(text):
+    import numpy as np
+    return np.unique(np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles(text)), dtype=np.uint64))
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two sorted unique hash arrays."""
+    import numpy as np
+
+    inter = len(np.intersect1d(a, b, assume_unique=True))
+    union = len(a) + len(b) - inter
+    return inter / union if union else 0.0
+
+
+class SimilarityIndex:
+    """Near-duplicate index for one question."""
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, permutations=SIMILARITY_PERMUTATIONS,
+                 bands=SIMILARITY_BANDS, seed=1):
+        import numpy as np
+
+        if permutations % bands:
+            raise ValueError("SIMILARITY_PERMUTATIONS must be a multiple of SIMILARITY_BANDS")
+        rng = np.random.default_rng(seed)
+        # h(x) = (a*x + b) mod p; a, b < 2^31 keep a*x + b inside uint64
+        self.a = rng.integers(1, 1 << 31, size=(permutations, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=(permutations, 1), dtype=np.uint64)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = permutations // bands
+        self.students = []   # per distinct essay: the first student who wrote it
+        self.members = []    # per distinct essay: everyone who wrote it
+        self.groups = {}     # shingle set (bytes) -> distinct essay index
+        self.essays = 0
+        self.hashes = []
+        self.signatures = []
+        self.buckets = defaultdict(list)  # (band, band values) -> essay indexes
+
+    def signature(self, hashes):
+        import numpy as np
+        return ((self.a * hashes[None, :] + self.b) % np.uint64(_PRIME)).min(axis=1).astype(np.uint32)
+
+    def add(self, student, text):
+        """Index one essay; returns False if it is too short to compare."""
+        hashes = shingle_hashes(text)
+        if len(hashes) < SIMILARITY_MIN_SHINGLES:
+            return False
+        self.essays += 1
+        key = hashes.tobytes()
+        if key in self.groups:
+            self.members[self.groups[key]].append(student)
+            return True
+        i = self.groups[key] = len(self.students)
+        sig = self.signature(hashes)
+        self.students.append(student)
+        self.members.append([student])
+        self.hashes.append(hashes)
+        self.signatures.append(sig)
+        for band in range(self.bands):
+            self.buckets[band, sig[band * self.rows:(band + 1) * self.rows].tobytes()].append(i)
+        return True
+
+    def candidates(self):
+        """(i, j) index arrays, i < j, of every pair of distinct essays sharing a bucket."""
+        import numpy as np
+
+        n = len(self.students)
+        codes = []
+        for bucket in self.buckets.values():
+            if len(bucket) > 1:
+                members = np.array(bucket, dtype=np.int64)
+                i, j = np.triu_indices(len(members), k=1)
+                codes.append(members[i] * n + members[j])
+        if not codes:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        codes = np.unique(np.concatenate(codes))
+        return codes // n, codes % n
+
+    def pairs(self, chunk=250000):
+        """[(student_a, student_b, similarity)] at or above the threshold, most similar first."""
+        import numpy as np
+
+        out = [(members[0], other, 1.0) for members in self.members for other in members[1:]]
+        first, second = self.candidates()
+        if not len(first):
+            return out
+        sigs = np.vstack(self.signatures)
+        # MinHash estimate first, vectorized over all candidates; the exact
+        # Jaccard only for those within MINHASH_MARGIN of the threshold
+        keep = []
+        for start in range(0, len(first), chunk):
+            i, j = first[start:start + chunk], second[start:start + chunk]
+            estimate = (sigs[i] == sigs[j]).mean(axis=1)
+            hit = estimate >= self.threshold - MINHASH_MARGIN
+            keep.extend(zip(i[hit].tolist(), j[hit].tolist()))
+        for i, j in keep:
+            score = jaccard(self.hashes[i], self.hashes[j])
+            if score >= self.threshold:
+                out.append((self.students[i], self.students[j], score))
+        return sorted(out, key=lambda p: -p[2])
+
+
+def scan(source, fields=ESSAY_FIELDS):
+    """{field: SimilarityIndex} over (student, answers, ...) records."""
+    indexes = {field: SimilarityIndex() for field in fields}
+    for student, answers, *_ in source:
+        for field, index in indexes.items():
+            index.add(student, answers.get(field))
+    return indexes
+
+
+def tee(source, indexes):
+    """Pass `source` through unchanged while indexing its essays (for streaming exports)."""
+    for record in source:
+        student, answers = record[0], record[1]
+        for field, index in indexes.items():
+            index.add(student, answers.get(field))
+        yield record
+
+
+def pair_rows(indexes):
+    return [
+        {'field': field, 'student_a': a, 'student_b': b, 'similarity': round(score, 3)}
+        for field, index in indexes.items() for a, b, score in index.pairs()
+    ]
+
+
+def peers(indexes):
+    """{(student, field): 'other:0.83; other2:0.71'} for annotating a results table."""
+    out = defaultdict(list)
+    for field, index in indexes.items():
+        for a, b, score in index.pairs():
+            out[a, field].append(f"{b}:{score:.2f}")
+            out[b, field].append(f"{a}:{score:.2f}")
+    return {key: '; '.join(v) for key, v in out.items()}
+
+
+def write_pairs(out, indexes):
+    rows = pair_rows(indexes)
+    writer = csv.DictWriter(out, fieldnames=PAIR_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return len(rows)
+
+
+def similar_csv(jrnl=None):
+    """Flagged pairs for the whole journaled cohort as CSV bytes, for a download button."""
+    buf = io.StringIO()
+    write_pairs(buf, scan((jrnl or journal.get_journal()).iter_students()))
+    return buf.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag near-duplicate essays across the cohort")
+    parser.add_argument("--out", required=True, help="CSV of flagged pairs")
+    parser.add_argument("--journal", default=journal.JOURNAL_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    indexes = scan(journal.Journal(args.journal).iter_students())
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        pairs = write_pairs(f, indexes)
+    essays = sum(index.essays for index in indexes.values())
+    print(f"{essays} essays, {pairs} similar pairs -> {args.out} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
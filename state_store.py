@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+import journal
+
+# ==========================================
+# EXAM STATE STORE (pluggable)
+# ==========================================
+# Everything sessions must agree on lives behind one interface:
+#   - the exam itself (status, opening phase, start time; see coordinator.py)
+#   - the cohort registry (who is where; see cohort.py)
+#   - per-student records: answers, locked phases, timer anchors (the journal)
+#   - item-analysis running sums, one contribution per student (item_analysis.py)
+#
+# EXAM_STORE=memory (default) keeps the exam and the cohort in this process;
+# one Streamlit process serves the whole room. EXAM_STORE=sqlite keeps them in
+# a shared SQLite file (EXAM_STORE_PATH) so several app.py workers on one
+# machine (see serve.py) run one exam together. Student records always go to
+# the journal file, which workers share the same way. A student who lands on
+# another worker logs in again and is restored from it.
+
+EXAM_STORE = os.getenv("EXAM_STORE", "memory")
+EXAM_STORE_PATH = os.getenv("EXAM_STORE_PATH", "exam_state.sqlite3")
+
+ExamState = namedtuple('ExamState', ['version', 'status', 'scenario', 'phase', 'started_at'])
+Student = namedtuple('Student', ['name', 'phase', 'scenario', 'exam_phase', 'locked', 'submitted', 'updated_at'])
+
+INITIAL_EXAM = ExamState(version=0, status='WAIT', scenario=1, phase=1, started_at=None)
+
+
+def cohort_position(rec):
+    if rec.phase == 'RUNNING':
+        return (rec.scenario, rec.exam_phase)
+    return rec.phase
+
+
+class _Students:
+    # Per-student records, shared by both backends
+
+    def record(self, student, kind, data):
+        journal.get_journal().record(student, kind, data)
+
+    def restore(self, student):
+        return journal.get_journal().restore(student)
+
+
+class MemoryStore(_Students):
+    """Single process: exam and cohort in memory, readers never lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = INITIAL_EXAM
+        self.students = {}       # name -> Student
+        self.counts = Counter()  # position -> number of students there
+        self.seen = {}           # name -> last liveness ping
+        self.item_students = set()
+        self.items = None        # item_analysis.ItemStats
+
+    # -- exam ------------------------------------------------------------
+    def exam(self):
+        return self.state
+
+    def start_exam(self, scenario, phase):
+        with self.lock:
+            if self.state.status != 'RUNNING':
+                self.state = ExamState(self.state.version + 1, 'RUNNING', scenario, phase, time.time())
+            return self.state
+
+    def reset_exam(self):
+        with self.lock:
+            self.state = ExamState(self.state.version + 1, 'WAIT', 1, 1, None)
+            return self.state
+
+    # -- cohort ----------------------------------------------------------
+    def report(self, name, phase, scenario, exam_phase, locked):
+        now = time.time()
+        with self.lock:
+            old = self.students.get(name)
+            rec = Student(name, phase, scenario, exam_phase, locked, old.submitted if old else None, now)
+            if old is not None:
+                self.counts[cohort_position(old)] -= 1
+            self.counts[cohort_position(rec)] += 1
+            self.students[name] = rec
+        self.seen[name] = now
+
+    def mark_submitted(self, name, outbox_id):
+        with self.lock:
+            old = self.students.get(name)
+            if old is not None:
+                self.students[name] = old._replace(submitted=outbox_id, updated_at=time.time())
+
+    def touch(self, name, t):
+        self.seen[name] = t
+
+    def cohort(self):
+        """(records, last_seen, counts per position) copies."""
+        with self.lock:
+            records = list(self.students.values())
+            counts = {k: v for k, v in self.counts.items() if v}
+        return records, dict(self.seen), counts
+
+    def reset_cohort(self):
+        with self.lock:
+            self.students.clear()
+            self.counts.clear()
+        self.seen.clear()
+
+    # -- item analysis ---------------------------------------------------
+    def add_item_stats(self, name, stats):
+        with self.lock:
+            if name in self.item_students:
+                return False
+            self.item_students.add(name)
+            self.items = stats if self.items is None else self.items.merge(stats)
+            return True
+
+    def replace_item_stats(self, names, stats):
+        with self.lock:
+            self.item_students = set(names)
+            self.items = stats
+
+    def item_stats(self):
+        with self.lock:
+            return None if self.items is None else type(self.items).from_json(self.items.to_json())
+
+
+class SQLiteStore(_Students):
+    """Several worker processes on one machine, sharing one SQLite file."""
+
+    def __init__(self, path=EXAM_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS exam ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, status TEXT NOT NULL,"
+            " scenario INTEGER NOT NULL, phase INTEGER NOT NULL, started_at REAL)"
+        )
+        self.conn.execute("INSERT OR IGNORE INTO exam VALUES (1, ?, ?, ?, ?, ?)", INITIAL_EXAM)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cohort ("
+            " name TEXT PRIMARY KEY, phase TEXT NOT NULL, scenario INTEGER NOT NULL,"
+            " exam_phase INTEGER NOT NULL, locked INTEGER NOT NULL, submitted INTEGER,"
+            " updated_at REAL NOT NULL, seen_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS item_students (name TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS item_stats (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT)")
+
+    def _write(self, *statements):
+        # One IMMEDIATE transaction: other workers wait on the file lock
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, args in statements:
+                    self.conn.execute(sql, args)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # -- exam ------------------------------------------------------------
+    def exam(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT version, status, scenario, phase, started_at FROM exam WHERE id = 1").fetchone()
+        return ExamState(*row)
+
+    def start_exam(self, scenario, phase):
+        # Only the first worker to start wins; the others see RUNNING
+        self._write(("UPDATE exam SET version = version + 1, status = 'RUNNING', scenario = ?, phase = ?,"
+                     " started_at = ? WHERE id = 1 AND status != 'RUNNING'", (scenario, phase, time.time())))
+        return self.exam()
+
+    def reset_exam(self):
+        self._write(("UPDATE exam SET version = version + 1, status = 'WAIT', scenario = 1, phase = 1,"
+                     " started_at = NULL WHERE id = 1", ()))
+        return self.exam()
+
+    # -- cohort ----------------------------------------------------------
+    def report(self, name, phase, scenario, exam_phase, locked):
+        now = time.time()
+        self._write((
+            "INSERT INTO cohort (name, phase, scenario, exam_phase, locked, updated_at, seen_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET phase = excluded.phase,"
+            " scenario = excluded.scenario, exam_phase = excluded.exam_phase, locked = excluded.locked,"
+            " updated_at = excluded.updated_at, seen_at = excluded.seen_at",
+            (name, phase, scenario, exam_phase, locked, now, now)))
+
+    def mark_submitted(self, name, outbox_id):
+        self._write(("UPDATE cohort SET submitted = ?, updated_at = ? WHERE name = ?",
+                     (outbox_id, time.time(), name)))
+
+    def touch(self, name, t):
+        self._write(("UPDATE cohort SET seen_at = ? WHERE name = ?", (t, name)))
+
+    def cohort(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, phase, scenario, exam_phase, locked, submitted, updated_at, seen_at FROM cohort"
+            ).fetchall()
+        records = [Student(*row[:-1]) for row in rows]
+        seen = {row[0]: row[-1] for row in rows}
+        counts = Counter(cohort_position(rec) for rec in records)
+        return records, seen, dict(counts)
+
+    def reset_cohort(self):
+        self._write(("DELETE FROM cohort", ()))
+
+    # -- item analysis ---------------------------------------------------
+    def add_item_stats(self, name, stats):
+        # Read-merge-write of one small row inside the IMMEDIATE transaction,
+        # so concurrent submissions from other workers are never lost
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = self.conn.execute("INSERT OR IGNORE INTO item_students VALUES (?)", (name,)).rowcount
+                if added:
+                    row = self.conn.execute("SELECT data FROM item_stats WHERE id = 1").fetchone()
+                    if row:
+                        stats = type(stats).from_json(row[0]).merge(stats)
+                    self.conn.execute("INSERT OR REPLACE INTO item_stats VALUES (1, ?)", (stats.to_json(),))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return bool(added)
+
+    def replace_item_stats(self, names, stats):
+        self._write(("DELETE FROM item_students", ()),
+                    *[("INSERT OR IGNORE INTO item_students VALUES (?)", (name,)) for name in names],
+                    ("INSERT OR REPLACE INTO item_stats VALUES (1, ?)", (stats.to_json(),)))
+
+    def item_stats(self):
+        from item_analysis import ItemStats
+
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM item_stats WHERE id = 1").fetchone()
+        return ItemStats.from_json(row[0]) if row else None
+
+
+BACKENDS = {'memory': MemoryStore, 'sqlite': SQLiteStore}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if EXAM_STORE not in BACKENDS:
+                raise ValueError(f"EXAM_STORE must be one of {sorted(BACKENDS)}, not {EXAM_STORE!r}")
+            _store = BACKENDS[EXAM_STORE]()
+        return _store
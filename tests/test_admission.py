@@ -0,0 +1,53 @@
+import pytest
+
+import admission
+
+
+@pytest.fixture(autouse=True)
+def gate(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_MAX_STARTING', 2)
+    monkeypatch.setattr(admission, 'ADMISSION_MAX_RUNNING', 0)
+    monkeypatch.setattr(admission, 'ADMISSION_LEASE_SECONDS', 15)
+    monkeypatch.setattr(admission, 'ADMISSION_QUEUE_SECONDS', 10)
+    admission.reset()
+    yield
+    admission.reset()
+
+
+def test_queue_is_fifo_and_slots_return_on_started():
+    t = 1000.0
+    assert admission.request('a', t) == 0
+    assert admission.request('b', t) == 0
+    assert admission.request('c', t) == 1
+    assert admission.request('d', t) == 2
+    admission.started('a', t + 1)
+    assert admission.request('d', t + 2) == 1
+    assert admission.request('c', t + 2) == 0
+
+
+def test_students_who_stop_polling_lose_their_place():
+    t = 1000.0
+    admission.request('a', t)
+    admission.request('b', t)
+    # c and d queue at the head, then close their tabs
+    assert admission.request('c', t) == 1
+    assert admission.request('d', t) == 2
+    admission.started('a', t + 1)
+    admission.started('b', t + 1)
+    for step in range(2, 20, 2):
+        admission.request('e', t + step)
+    # still polling after c and d went quiet: e moves up and is admitted
+    assert admission.request('e', t + 20) == 0
+    assert admission.admission_stats()['abandoned'] == 2
+
+
+def test_polling_keeps_a_place_in_the_queue(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_LEASE_SECONDS', 3600)
+    t = 1000.0
+    admission.request('a', t)
+    admission.request('b', t)
+    admission.request('c', t)
+    admission.request('d', t)
+    for step in range(1, 30):
+        assert admission.request('c', t + step * 2) == 1
+        assert admission.request('d', t + step * 2) == 2
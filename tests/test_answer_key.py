@@ -0,0 +1,82 @@
+import pytest
+
+from answer_key import ambiguous_answers, route_ambiguous, score_cohort
+
+
+def grade(field, *answers):
+    scores, status, canonical = score_cohort([{field: a} for a in answers], fields=[field])
+    return list(status[field]), list(scores[field]), list(canonical[field])
+
+
+@pytest.mark.parametrize("answer, status, canonical", [
+    ("Sympathetic", 'exact', 'Sympathetic'),
+    ("  SYMPATHETIC nervous-system!", 'exact', 'Sympathetic'),
+    ("ซิมพาเทติก", 'exact', 'Sympathetic'),
+    ("sympathtic", 'fuzzy', 'Sympathetic'),
+    # contains a key term but may be wrong: left to the AI grader
+    ("parasympathetic", 'ambiguous', 'Sympathetic'),
+    ("somatic", 'wrong', None),
+    ("", 'blank', None),
+    (None, 'blank', None),
+])
+def test_term_matching(answer, status, canonical):
+    statuses, scores, canonicals = grade('s4_q1_system', answer)
+    assert statuses == [status]
+    assert scores == [1.0 if status in ('exact', 'fuzzy') else 0.0]
+    assert canonicals == [canonical]
+
+
+def test_aliases_normalize_greek_beta_and_case():
+    assert grade('s3_diagnosis', "β-Thalassemia", "BETA THALASSEMIA MAJOR")[0] == ['exact', 'exact']
+
+
+def test_near_miss_between_fuzzy_and_wrong_is_ambiguous():
+    # 4 edits on a 14-letter alias: too far for a typo, too close to reject
+    assert grade('s4_q1_source', "adrenal medical")[0] == ['ambiguous']
+
+
+def test_choices_only_match_exactly():
+    statuses, scores, _ = grade('s1_p1_system', "Parasympathetic", "parasympathetic", "Parasympathetc", "Sympathetic")
+    assert statuses == ['exact', 'exact', 'wrong', 'wrong']
+    assert scores == [1.0, 1.0, 0.0, 0.0]
+
+
+def test_a_group_answer_only_counts_once():
+    rows = [
+        {'s1_p1_chem1': "Organophosphate", 's1_p1_chem2': "organo-phosphate"},
+        {'s1_p1_chem1': "Carbamate", 's1_p1_chem2': "ออร์กาโนฟอสเฟต"},
+        {'s1_p1_chem1': "", 's1_p1_chem2': "carbamates"},
+    ]
+    scores, status, _ = score_cohort(rows, fields=['s1_p1_chem1', 's1_p1_chem2'])
+    assert list(status['s1_p1_chem2']) == ['duplicate', 'exact', 'exact']
+    assert scores.sum(axis=1).tolist() == [1.0, 2.0, 1.0]
+
+
+def test_hormone_pairs_are_scored_from_two_columns_and_deduplicated():
+    row = {'s2_hormone_0': "Insulin", 's2_change_0': "Decrease",
+           's2_hormone_1': "Insulin", 's2_change_1': "Decrease",
+           's2_hormone_2': "Insulin", 's2_change_2': "Increase"}
+    scores, status, _ = score_cohort([row], fields=['s2_pair_0', 's2_pair_1', 's2_pair_2'])
+    assert status.iloc[0].tolist() == ['exact', 'duplicate', 'wrong']
+    assert scores.iloc[0].tolist() == [1.0, 0.0, 0.0]
+
+
+def test_identical_ambiguous_answers_are_submitted_once():
+    rows = [{'s4_q1_system': a} for a in ("parasympathetic", "Parasympathetic!", "sympathetic", "norepinephrine")]
+    rows[3]['s4_q1_hormone'] = "norepinephrine"
+    _, status, _ = score_cohort(rows, fields=['s4_q1_system', 's4_q1_hormone'])
+    records = ambiguous_answers(rows, status)
+    assert [(r['row'], r['field']) for r in records] == [(0, 's4_q1_system'), (1, 's4_q1_system'),
+                                                        (3, 's4_q1_hormone')]
+
+    submitted = []
+
+    def submit(question, answer, rubric, tag=None):
+        submitted.append((question, answer, rubric, tag))
+        return len(submitted)
+
+    jobs = route_ambiguous(records, submit)
+    assert jobs == {(0, 's4_q1_system'): 1, (1, 's4_q1_system'): 1, (3, 's4_q1_hormone'): 2}
+    assert submitted[0] == ("Division of the nervous system causing tachycardia in shock", "parasympathetic",
+                            "Sympathetic", 's4_q1_system')
+    assert submitted[1][2] == "Epinephrine"
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from flowchart import ANSWER_HEADER, FLOWCHARTS, OPTIONS_HEADER, ORDER_SEPARATOR, score_flowcharts, score_orders
+
+
+def score(*orders, k=4, width=6):
+    ids = np.full((len(orders), width), -1, dtype=np.int16)
+    for row, order in enumerate(orders):
+        ids[row, :len(order)] = order
+    return score_orders(ids, k)
+
+
+@pytest.mark.parametrize("order, lcs, tau, expected", [
+    ([0, 1, 2, 3], 4, 1.0, 1.0),
+    ([3, 2, 1, 0], 1, -1.0, 0.7 * 1 / 4),
+    ([0, 2, 1, 3], 3, 4 / 6, 0.7 * 3 / 4 + 0.3 * (5 / 6)),
+    # half the blocks, in order: full agreement scaled by how many were placed
+    ([0, 1], 2, 1.0, 0.7 * 2 / 4 + 0.3 * 2 / 4),
+    # one block has no pairs to order: agreement counts it as placed
+    ([2], 1, 0.0, 0.7 * 1 / 4 + 0.3 * 1 / 4),
+    ([], 0, 0.0, 0.0),
+])
+def test_ordering_metrics(order, lcs, tau, expected):
+    m = score(order)
+    assert m['lcs'][0] == lcs
+    assert m['kendall_tau'][0] == pytest.approx(tau)
+    assert m['score'][0] == pytest.approx(expected)
+
+
+def test_each_distractor_costs_a_fixed_penalty_and_score_stays_in_range():
+    m = score([0, 1, 4, 2, 3], [0, 1, 4, 5, 2, 3], [4, 5])
+    assert list(m['distractors']) == [1, 2, 2]
+    assert m['score'][0] == pytest.approx(0.9)
+    assert m['score'][1] == pytest.approx(0.8)
+    assert m['score'][2] == 0.0
+
+
+def test_rows_are_scored_independently():
+    together = score([0, 1, 2, 3], [3, 2, 1, 0], [0, 2, 1, 3])['score']
+    alone = [score(o)['score'][0] for o in ([0, 1, 2, 3], [3, 2, 1, 0], [0, 2, 1, 3])]
+    assert together == pytest.approx(alone)
+
+
+def test_stored_answer_forms_score_the_same():
+    correct = FLOWCHARTS[1]['correct']
+    containers = [{'header': OPTIONS_HEADER, 'items': FLOWCHARTS[1]['distractors']},
+                  {'header': ANSWER_HEADER, 'items': correct}]
+    rows = [{'s1_flowchart': containers}, {'s1_flowchart': str(containers)},
+            {'s1_flowchart': ORDER_SEPARATOR.join(correct)}, {'s1_flowchart': None}, {}]
+    out = score_flowcharts(rows, scenarios=[1])
+    assert list(out['s1_flowchart_score']) == [1.0, 1.0, 1.0, 0.0, 0.0]
@@ -0,0 +1,25 @@
+import grading
+
+
+def pool(**kw):
+    model = grading.FakeModel(latency=0, jitter=0)
+    return grading.GradingPool(model, max_workers=2, rate_per_sec=1000, burst=100, **kw)
+
+
+def test_collect_hands_over_a_finished_job_once():
+    p = pool()
+    job_id = p.submit("Q", "atropine", "muscarinic")
+    p.result(job_id, timeout=5)
+    job = p.collect(job_id)
+    assert job['status'] == 'done' and job['attempts'] == 1
+    assert p.collect(job_id) is None
+    assert p.jobs == {}
+    p.shutdown()
+
+
+def test_uncollected_finished_jobs_are_capped():
+    p = pool(keep_finished=3)
+    for i in range(10):
+        p.submit("Q", f"answer {i}", "r")
+    p.shutdown()
+    assert len(p.jobs) == 3 and len(p.finished) == 3
@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+
+import journal
+
+
+@pytest.fixture
+def jrnl(tmp_path):
+    # A long interval keeps the writer thread out of the way; the tests flush
+    j = journal.Journal(str(tmp_path / "journal.sqlite3"), flush_interval=3600)
+    j.conn.execute("PRAGMA busy_timeout=50")
+    return j
+
+
+def test_failed_flush_is_rolled_back_and_retried(jrnl):
+    jrnl.record('A', journal.ANSWERS, {'s1_p1_vdo1': 'miosis'})
+    other = sqlite3.connect(jrnl.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError):
+        jrnl.flush()
+    assert not jrnl.conn.in_transaction
+    other.execute("ROLLBACK")
+
+    jrnl.record('A', journal.ANSWERS, {'s1_p1_vdo2': 'fasciculation'})
+    assert jrnl.flush() == 2
+    assert jrnl.restore('A')['answers'] == {'s1_p1_vdo1': 'miosis', 's1_p1_vdo2': 'fasciculation'}
+    assert jrnl.stats()['failures'] == 1
+
+
+def test_restore_replays_records_in_order(jrnl):
+    jrnl.record('A', journal.ANSWERS, {'q': 'first'})
+    jrnl.record('A', journal.STATE, {'current_scenario': 2})
+    jrnl.record('A', journal.ANSWERS, {'q': 'second'})
+    assert jrnl.restore('A') == {'answers': {'q': 'second'}, 'state': {'current_scenario': 2}}
+    assert jrnl.restore('B') is None
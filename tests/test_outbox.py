@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+
+import pytest
+
+import outbox
+
+
+@pytest.fixture
+def box(tmp_path):
+    b = outbox.Outbox(str(tmp_path / "outbox.sqlite3"), poll_interval=0.01)
+    yield b
+    b.stop()
+
+
+def rows(box):
+    return box.conn.execute("SELECT student, status FROM outbox ORDER BY id").fetchall()
+
+
+def test_second_submission_is_not_queued_while_one_is_live(box):
+    first = box.enqueue('A', 'http://form', {'entry.1': 'x'})
+    assert box.enqueue('A', 'http://form', {'entry.1': 'x'}) == first
+    box.conn.execute("UPDATE outbox SET status = ? WHERE id = ?", (outbox.DELIVERED, first))
+    assert box.enqueue('A', 'http://form', {'entry.1': 'x'}) == first
+    assert box.enqueue('B', 'http://form', {'entry.1': 'y'}) != first
+    assert rows(box) == [('A', outbox.DELIVERED), ('B', outbox.PENDING)]
+
+
+def test_failed_submission_can_be_sent_again(box):
+    first = box.enqueue('A', 'http://form', {})
+    box.conn.execute("UPDATE outbox SET status = ? WHERE id = ?", (outbox.FAILED, first))
+    assert box.enqueue('A', 'http://form', {}) != first
+    assert box.delivery_state('A')['status'] == outbox.PENDING
+
+
+def test_sender_survives_a_database_error(box, monkeypatch):
+    calls = []
+    again = threading.Event()
+
+    def claim_due():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        again.set()
+        return []
+
+    monkeypatch.setattr(box, '_claim_due', claim_due)
+    box.start()
+    assert again.wait(5)
+    assert box.thread.is_alive()
@@ -0,0 +1,14 @@
+import serve
+
+
+def test_worker_cookie_is_read_from_the_request():
+    head = b"GET / HTTP/1.1\r\nHost: exam\r\nCookie: _streamlit_xsrf=x; exam_worker=8602\r\n\r\n"
+    assert serve.cookie_port(head, [8601, 8602]) == 8602
+    assert serve.cookie_port(head, [8601]) is None
+    assert serve.cookie_port(b"GET / HTTP/1.1\r\nHost: exam\r\n\r\n", [8601]) is None
+
+
+def test_set_cookie_goes_after_the_status_line():
+    head = serve.set_cookie(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n", 8601)
+    assert head.startswith(b"HTTP/1.1 200 OK\r\nSet-Cookie: exam_worker=8601;")
+    assert head.endswith(b"Content-Length: 0\r\n\r\n")
@@ -0,0 +1,38 @@
+import time
+
+import similarity
+
+ESSAY = ("Atropine is a competitive antagonist at muscarinic acetylcholine receptors so it blocks "
+         "the parasympathetic effects of the excess acetylcholine but not the nicotinic receptors")
+
+
+def essay(i):
+    return f"student {i} wrote about {i * 7919} unrelated things like topic {i % 97} and case {i * 31}"
+
+
+def test_identical_essays_are_one_group_reported_linearly():
+    index = similarity.SimilarityIndex()
+    copies = [f"c{i}" for i in range(1500)]
+    for name in copies:
+        index.add(name, ESSAY)
+    for i in range(200):
+        index.add(f"u{i}", essay(i))
+
+    started = time.perf_counter()
+    pairs = index.pairs()
+    assert time.perf_counter() - started < 2
+    assert len(index.students) == 201
+    assert index.essays == 1700
+    assert pairs == [('c0', name, 1.0) for name in copies[1:]]
+
+
+def test_near_duplicates_are_reported_for_the_group():
+    index = similarity.SimilarityIndex()
+    index.add('a', ESSAY)
+    index.add('b', ESSAY)
+    index.add('c', ESSAY + " at the neuromuscular junction")
+    index.add('d', essay(1))
+    pairs = index.pairs()
+    assert pairs[0] == ('a', 'b', 1.0)
+    assert [(a, b) for a, b, _ in pairs[1:]] == [('a', 'c')]
+    assert similarity.peers({'s1_essay1': index})[('b', 's1_essay1')] == 'a:1.00'
@@ -0,0 +1,15 @@
+import state_store
+
+
+def test_sqlite_exam_survives_a_reopen_until_reset(tmp_path):
+    path = str(tmp_path / "exam_state.sqlite3")
+    started = state_store.SQLiteStore(path).start_exam(2, 1)
+    assert started.status == 'RUNNING'
+
+    reopened = state_store.SQLiteStore(path)
+    assert reopened.exam() == started
+
+    reset = reopened.reset_exam()
+    assert (reset.status, reset.scenario, reset.phase, reset.started_at) == ('WAIT', 1, 1, None)
+    assert reset.version == started.version + 1
+    assert state_store.SQLiteStore(path).exam() == reset